@@ -5,15 +5,31 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import email.utils
+import gzip
+import http.client
+import http.server
 import json
+import os
+import random
+import re
 import sys
+import tempfile
+import threading
+import time
 import urllib.error
 import urllib.parse
-import urllib.request
 import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any
 
+try:
+    import brotli
+except ImportError:  # Optional: only used for .br siblings of the compact output.
+    brotli = None
+
 
 APP_ID_DEFAULT = "275"
 APP_IDENTIFIER_DEFAULT = "universityofcambridgesport_android"
@@ -24,17 +40,244 @@ APP_VERSION_CODE_DEFAULT = "10693"
 APP_VERSION_NAME_DEFAULT = "106.93"
 APP_STATIC_BEARER_DEFAULT = "680857c4038d4571a0ec25f8efd6e80a"
 APP_USER_AGENT_DEFAULT = "universityofcambridgesport/10693 Android 14 Pixel"
+HOME_TTL_DEFAULT = 24 * 3600
+ACTIVITY_LIST_TTL_DEFAULT = 6 * 3600
+AUTH_ERROR_CODES = (401, 403)
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+DAY_SECONDS = 24 * 3600
+# DAYS:MAX_AGE pairs: windows starting within DAYS days from now are re-fetched once
+# their data is MAX_AGE seconds old. Windows past the last tier use its MAX_AGE.
+REFRESH_TIERS_DEFAULT = "1:0,3:900,14:3600"
 
 
-def parse_args() -> argparse.Namespace:
+def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Fetch CamUniSport availability JSON, just like the app does it.")
-    p.add_argument("--json-out", required=True, help="Output file path.")
+    p.add_argument("--json-out", help="Output file path. Required unless --config is given.")
+    p.add_argument(
+        "--config",
+        help=(
+            "JSON batch config with a list of jobs (see README). Clubs are bootstrapped once "
+            "and fetched concurrently; the other options act as defaults for every job."
+        ),
+    )
     p.add_argument("--keyword", default="padel", help='Filter keyword. Default: "padel".')
     p.add_argument("--days", type=int, default=14, help="Horizon in days. Default: 14.")
     p.add_argument("--club-id", type=int, default=CLUB_ID_DEFAULT)
     p.add_argument("--host", default=HOST_DEFAULT)
     p.add_argument("--locale", default=LOCALE_DEFAULT)
-    return p.parse_args()
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of activities fetched in parallel. Default: 4.",
+    )
+    p.add_argument(
+        "--max-rps-per-host",
+        type=float,
+        default=8.0,
+        help="Max requests per second sent to any one host (0 disables). Default: 8.",
+    )
+    p.add_argument(
+        "--request-timeout",
+        type=float,
+        default=25,
+        help="Timeout in seconds for a single HTTP request. Default: 25.",
+    )
+    p.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Retries per request on network errors, 429 and 5xx. Default: 2.",
+    )
+    p.add_argument(
+        "--budget",
+        type=float,
+        default=0,
+        help="Overall run budget in seconds; no request or retry starts past it (0 disables). Default: 0.",
+    )
+    p.add_argument(
+        "--cache-dir",
+        help="Cache homeScreen credentials and the activity list here. Disabled if unset.",
+    )
+    p.add_argument(
+        "--home-ttl",
+        type=int,
+        default=HOME_TTL_DEFAULT,
+        help=f"Seconds a cached homeScreen response is used without revalidation. Default: {HOME_TTL_DEFAULT}.",
+    )
+    p.add_argument(
+        "--activity-list-ttl",
+        type=int,
+        default=ACTIVITY_LIST_TTL_DEFAULT,
+        help=f"Seconds a cached activity list is used without revalidation. Default: {ACTIVITY_LIST_TTL_DEFAULT}.",
+    )
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Merge into the existing --json-out file, re-fetching only stale days.",
+    )
+    p.add_argument(
+        "--refresh-tiers",
+        type=parse_refresh_tiers,
+        default=REFRESH_TIERS_DEFAULT,
+        help=(
+            "Comma-separated DAYS:MAX_AGE pairs for --incremental: days starting within DAYS "
+            f"days are re-fetched once MAX_AGE seconds old. Default: {REFRESH_TIERS_DEFAULT}."
+        ),
+    )
+    p.add_argument(
+        "--chunk-days",
+        type=float,
+        default=7,
+        help="Split each availability request into chunks of this many days (0 disables). Default: 7.",
+    )
+    p.add_argument(
+        "--chunk-retries",
+        type=int,
+        default=0,
+        help="Extra attempts per failed chunk, on top of --retries per request. Default: 0.",
+    )
+    p.add_argument(
+        "--compact-out",
+        help="Also write a compact columnar JSON here, with precompressed .gz/.br siblings.",
+    )
+    p.add_argument(
+        "--compact-shard-dir",
+        help="Also write the compact JSON split per UTC day into this directory, with an index.json.",
+    )
+    p.add_argument(
+        "--delta-out",
+        help="Also write the slots added, removed or changed since the previous --json-out here.",
+    )
+    p.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Stay resident and refresh incrementally, keeping credentials, the activity list "
+            "and the last snapshot in memory. Outputs are only rewritten when slots change."
+        ),
+    )
+    p.add_argument(
+        "--watch-min-interval",
+        type=float,
+        default=60,
+        help="Shortest pause in seconds between --watch refreshes. Default: 60.",
+    )
+    p.add_argument(
+        "--watch-max-interval",
+        type=float,
+        default=900,
+        help="Longest pause in seconds between --watch refreshes. Default: 900.",
+    )
+    p.add_argument(
+        "--serve-port",
+        type=int,
+        default=0,
+        help="With --watch, serve the current outputs and deltas on 127.0.0.1:PORT (0 disables).",
+    )
+    return p
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    p = build_parser()
+    args = p.parse_args(argv)
+    if not args.json_out and not args.config:
+        p.error("--json-out is required unless --config is given")
+    if args.serve_port and not args.watch:
+        p.error("--serve-port requires --watch")
+    return args
+
+
+def parse_refresh_tiers(text: str) -> list[tuple[float, int]]:
+    tiers: list[tuple[float, int]] = []
+    try:
+        for part in text.split(","):
+            days, max_age = part.split(":")
+            tiers.append((float(days), int(max_age)))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid refresh tiers: {text!r}") from None
+    if not tiers:
+        raise argparse.ArgumentTypeError("At least one refresh tier is required.")
+    return sorted(tiers)
+
+
+# Options a --config job may set; the others apply to the whole run.
+JOB_OPTIONS = (
+    "json_out",
+    "keyword",
+    "days",
+    "club_id",
+    "host",
+    "locale",
+    "incremental",
+    "compact_out",
+    "compact_shard_dir",
+    "delta_out",
+)
+
+
+def _job_option(action: argparse.Action, value: Any) -> Any:
+    """Check and convert a config value the way argparse does for the same option."""
+    if value is None and action.default is None:
+        return None
+    if action.nargs == 0:
+        # A store_true flag such as --incremental.
+        if not isinstance(value, bool):
+            raise ValueError("expected true or false")
+        return value
+    expected = {int: "an integer", float: "a number"}.get(action.type, "a string")
+    if isinstance(value, bool):
+        raise ValueError(f"expected {expected}")
+    if isinstance(value, str) and action.type is not None:
+        try:
+            value = action.type(value)
+        except ValueError:
+            raise ValueError(f"expected {expected}") from None
+    elif action.type in (int, float) and isinstance(value, (int, float)) and value == action.type(value):
+        value = action.type(value)
+    elif not isinstance(value, str):
+        raise ValueError(f"expected {expected}")
+    if action.choices is not None and value not in action.choices:
+        raise ValueError(f"expected one of {', '.join(map(str, action.choices))}")
+    return value
+
+
+def load_jobs(args: argparse.Namespace) -> list[argparse.Namespace]:
+    """Read --config into one namespace per job, defaulting to the CLI options.
+
+    Job values are converted and checked like the matching command-line
+    options, and any problem is raised as a ValueError naming the job and key.
+    """
+    with open(args.config, encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict) or not isinstance(config.get("jobs", []), list):
+        raise ValueError(f"{args.config} must be an object with a list of jobs.")
+    actions = {action.dest: action for action in build_parser()._actions if action.dest in JOB_OPTIONS}
+    entries: list[dict[str, Any]] = []
+    for index, entry in enumerate([config.get("defaults") or {}, *config.get("jobs", [])]):
+        where = "defaults" if index == 0 else f"job {index}"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where} in {args.config} must be an object.")
+        unknown = sorted(set(entry) - set(JOB_OPTIONS))
+        if unknown:
+            raise ValueError(f"Unsupported job option(s) in {args.config}: {', '.join(unknown)}")
+        checked: dict[str, Any] = {}
+        for key, value in entry.items():
+            try:
+                checked[key] = _job_option(actions[key], value)
+            except (ValueError, argparse.ArgumentTypeError) as e:
+                raise ValueError(f"Invalid {key} {value!r} for {where} in {args.config}: {e}") from None
+        entries.append(checked)
+    defaults, job_entries = entries[0], entries[1:]
+    jobs: list[argparse.Namespace] = []
+    for entry in job_entries:
+        job = argparse.Namespace(**{**vars(args), **defaults, **entry})
+        if not job.json_out:
+            raise ValueError(f"Every job in {args.config} needs a json_out.")
+        jobs.append(job)
+    if not jobs:
+        raise ValueError(f"No jobs in {args.config}.")
+    return jobs
 
 
 @dataclass
@@ -43,18 +286,365 @@ class GSCredentials:
     api_key: str
 
 
+class HostRateLimiter:
+    """Space out request starts per host so parallel workers stay polite."""
+
+    def __init__(self, max_per_second: float = 0.0) -> None:
+        self.configure(max_per_second)
+        self._lock = threading.Lock()
+        self._next_slot: dict[str, float] = {}
+
+    def configure(self, max_per_second: float) -> None:
+        self.min_interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+
+    def wait(self, host: str) -> None:
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: http.client.HTTPMessage
+    body: bytes
+
+
+def _decode_body(body: bytes, encoding: str) -> bytes:
+    encoding = encoding.strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Some servers send raw deflate without the zlib wrapper.
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+class CircuitBreaker:
+    """Stop sending requests to a host after repeated failures.
+
+    After `threshold` consecutive failed requests the host is rejected for
+    `cooldown` seconds. Then a single probe request goes through while the others
+    are still rejected: a failure opens the breaker again, a success closes it.
+    A probe that never reports back is replaced after another cooldown.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._open_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def check(self, host: str) -> None:
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return
+            now = time.monotonic()
+            if now < open_until:
+                raise urllib.error.URLError(f"circuit open for {host}")
+            # This caller is the probe; keep the others out until it reports back.
+            self._open_until[host] = now + self.cooldown
+
+    def record(self, host: str, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._failures.pop(host, None)
+                self._open_until.pop(host, None)
+                return
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.threshold:
+                self._open_until[host] = time.monotonic() + self.cooldown
+
+
+def _retry_after_seconds(headers: Any) -> float | None:
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - dt.datetime.now(tz=dt.timezone.utc)).total_seconds())
+
+
+class HttpSession:
+    """Keep-alive connection pool shared by every fetch_* call.
+
+    Idle connections are kept per (scheme, host) and handed to one thread at a
+    time. Errors are raised as urllib.error.HTTPError/URLError so callers can
+    keep handling them the same way as with urllib.request.urlopen.
+
+    Network errors, 429 and 5xx responses are retried with jittered exponential
+    backoff (or the server's Retry-After), unless the server asks to wait longer
+    than BACKOFF_MAX or the retry would not fit in the remaining run budget. The
+    host's circuit breaker is checked once per get() and counts a failure only
+    when the request gives up.
+    """
+
+    MAX_REDIRECTS = 5
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 10.0
+
+    def __init__(self, timeout: float = 25, max_idle_per_host: int = 8, retries: int = 2) -> None:
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.retries = retries
+        self.deadline: float | None = None
+        self.rate_limiter = HostRateLimiter()
+        self.breaker = CircuitBreaker()
+        self.stats = {"requests": 0, "connections_opened": 0, "connections_reused": 0, "retries": 0}
+        self._idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme: str, netloc: str) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                self.stats["connections_reused"] += 1
+                return idle.pop(), True
+            self.stats["connections_opened"] += 1
+        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return conn_cls(netloc, timeout=self.timeout), False
+
+    def _release(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def set_budget(self, seconds: float) -> None:
+        self.deadline = time.monotonic() + seconds if seconds > 0 else None
+
+    def _remaining(self) -> float | None:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def _send(self, url: str, headers: dict[str, str], timeout: float) -> HttpResponse:
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        request_headers = {"Accept-Encoding": "gzip, deflate", **headers}
+        while True:
+            conn, reused = self._acquire(parts.scheme, parts.netloc)
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection; retry on a fresh one.
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(parts.scheme, parts.netloc, conn)
+            body = _decode_body(body, resp.headers.get("Content-Encoding", ""))
+            return HttpResponse(status=resp.status, headers=resp.headers, body=body)
+
+    def get(
+        self, url: str, *, params: dict[str, Any], headers: dict[str, str]
+    ) -> HttpResponse:
+        query = urllib.parse.urlencode(params, doseq=True)
+        full_url = f"{url}?{query}" if query else url
+        host = urllib.parse.urlsplit(full_url).netloc
+        self.breaker.check(host)
+        attempt = 0
+        while True:
+            remaining = self._remaining()
+            if remaining is not None and remaining <= 0:
+                raise urllib.error.URLError("run budget exhausted")
+            timeout = self.timeout if remaining is None else min(self.timeout, remaining)
+            try:
+                resp = self._get_once(full_url, headers, timeout)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRYABLE_STATUS_CODES:
+                    # The host answered, so as far as the breaker is concerned it is up.
+                    self.breaker.record(host, ok=True)
+                    raise
+                error: urllib.error.URLError = e
+                delay = _retry_after_seconds(e.headers)
+            except urllib.error.URLError as e:
+                error = e
+                delay = None
+            else:
+                self.breaker.record(host, ok=True)
+                return resp
+            if delay is None:
+                delay = random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2**attempt))
+            remaining = self._remaining()
+            # Give up when out of retries, when the server asks to wait so long it would
+            # stall the worker, or when the wait would not fit in the budget.
+            if (
+                attempt >= self.retries
+                or delay > self.BACKOFF_MAX
+                or (remaining is not None and delay >= remaining)
+            ):
+                self.breaker.record(host, ok=False)
+                raise error
+            attempt += 1
+            with self._lock:
+                self.stats["retries"] += 1
+            time.sleep(delay)
+
+    def _get_once(self, full_url: str, headers: dict[str, str], timeout: float) -> HttpResponse:
+        for _ in range(self.MAX_REDIRECTS + 1):
+            self.rate_limiter.wait(urllib.parse.urlsplit(full_url).netloc)
+            with self._lock:
+                self.stats["requests"] += 1
+            try:
+                resp = self._send(full_url, headers, timeout)
+            except (OSError, http.client.HTTPException) as e:
+                raise urllib.error.URLError(e) from e
+            location = resp.headers.get("Location")
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                full_url = urllib.parse.urljoin(full_url, location)
+                continue
+            if resp.status >= 400:
+                raise urllib.error.HTTPError(
+                    full_url, resp.status, http.client.responses.get(resp.status, ""), resp.headers, None
+                )
+            return resp
+        raise urllib.error.URLError(f"Too many redirects for {full_url}")
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+
+SESSION = HttpSession()
+
+
 def _json_get(url: str, *, params: dict[str, Any], headers: dict[str, str]) -> Any:
-    query = urllib.parse.urlencode(params, doseq=True)
-    full_url = f"{url}?{query}" if query else url
-    req = urllib.request.Request(full_url, method="GET")
-    for key, value in headers.items():
-        req.add_header(key, value)
-    with urllib.request.urlopen(req, timeout=25) as resp:
-        body = resp.read().decode("utf-8", errors="replace")
-    return json.loads(body)
+    resp = SESSION.get(url, params=params, headers=headers)
+    return json.loads(resp.body.decode("utf-8", errors="replace"))
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Write via a temp file and rename, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 
+class ResponseCache:
+    """JSON responses kept in memory, and on disk if a directory is given, with a per-entry TTL.
 
-def fetch_home_config(host: str, club_id: int, locale: str) -> dict[str, Any]:
+    Entries younger than their TTL are returned without touching the network.
+    Older entries are revalidated with If-None-Match/If-Modified-Since when the
+    server sent an ETag/Last-Modified, so an unchanged payload costs a 304.
+    """
+
+    def __init__(self, directory: str | None, ttls: dict[str, int]) -> None:
+        self.directory = directory
+        self.ttls = ttls
+        self._memory: dict[str, dict[str, Any]] = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ".json")
+
+    def _load(self, key: str) -> dict[str, Any] | None:
+        if key in self._memory or self.directory is None:
+            return self._memory.get(key)
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, entry: dict[str, Any]) -> None:
+        self._memory[key] = entry
+        if self.directory is not None:
+            _atomic_write(self._path(key), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+    def invalidate(self, key: str) -> None:
+        self._memory.pop(key, None)
+        if self.directory is None:
+            return
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_json(
+        self,
+        kind: str,
+        key: str,
+        url: str,
+        *,
+        params: dict[str, Any],
+        headers: dict[str, str],
+    ) -> Any:
+        entry = self._load(key)
+        now = time.time()
+        if entry is not None and now - entry["fetched_at"] < self.ttls.get(kind, 0):
+            return entry["body"]
+
+        conditional = dict(headers)
+        if entry is not None and entry.get("etag"):
+            conditional["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+        resp = SESSION.get(url, params=params, headers=conditional)
+        if resp.status == 304 and entry is not None:
+            entry["fetched_at"] = now
+        else:
+            entry = {
+                "fetched_at": now,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "body": json.loads(resp.body.decode("utf-8", errors="replace")),
+            }
+        self._store(key, entry)
+        return entry["body"]
+
+
+def _home_cache_key(host: str, club_id: int, locale: str) -> str:
+    return f"home_{urllib.parse.urlsplit(host).netloc}_{club_id}_{locale}"
+
+
+def _activity_list_cache_key(gs: GSCredentials, locale: str) -> str:
+    return f"activity_list_{urllib.parse.urlsplit(gs.base_url).netloc}_{locale}"
+
+
+def fetch_home_config(
+    host: str, club_id: int, locale: str, cache: ResponseCache | None = None
+) -> dict[str, Any]:
     url = f"{host.rstrip('/')}/mob/homeScreen/{club_id}"
     params = {
         "c": club_id,
@@ -74,6 +664,9 @@ def fetch_home_config(host: str, club_id: int, locale: str) -> dict[str, Any]:
         "appversion": APP_VERSION_NAME_DEFAULT,
         "User-Agent": APP_USER_AGENT_DEFAULT,
     }
+    if cache is not None:
+        key = _home_cache_key(host, club_id, locale)
+        return cache.get_json("home", key, url, params=params, headers=headers)
     return _json_get(url, params=params, headers=headers)
 
 
@@ -86,14 +679,20 @@ def extract_gs_credentials(home_json: dict[str, Any]) -> GSCredentials:
     return GSCredentials(base_url=base_url.rstrip("/"), api_key=api_key)
 
 
-def fetch_activity_list(gs: GSCredentials, locale: str) -> dict[str, Any]:
+def fetch_activity_list(
+    gs: GSCredentials, locale: str, cache: ResponseCache | None = None
+) -> dict[str, Any]:
     url = f"{gs.base_url}/api/activity/list"
     headers = {
         "Accept": "application/json",
         "AuthenticationKey": gs.api_key,
         "User-Agent": APP_USER_AGENT_DEFAULT,
     }
-    return _json_get(url, params={"locale": locale, "globalInfo": 1}, headers=headers)
+    params = {"locale": locale, "globalInfo": 1}
+    if cache is not None:
+        key = _activity_list_cache_key(gs, locale)
+        return cache.get_json("activity_list", key, url, params=params, headers=headers)
+    return _json_get(url, params=params, headers=headers)
 
 
 def fetch_activity_availability(
@@ -155,91 +754,812 @@ def parse_slot_counts(slot: dict[str, Any]) -> tuple[int, int]:
     return 0, 0
 
 
-def main() -> int:
-    args = parse_args()
-    now_utc = int(dt.datetime.now(tz=dt.timezone.utc).timestamp())
-    to_utc = int((dt.datetime.now(tz=dt.timezone.utc) + dt.timedelta(days=args.days)).timestamp())
-    keyword = args.keyword.lower().strip()
+def fetch_activity_slots(
+    gs: GSCredentials,
+    activity_id: str,
+    from_utc: int,
+    to_utc: int,
+    locale: str,
+) -> list[dict[str, Any]]:
+    av = fetch_activity_availability(gs, activity_id, from_utc, to_utc, locale)
+    slots: list[dict[str, Any]] = []
+    for bookable in av.get("bookableItems", []):
+        b_name = str(bookable.get("n") or bookable.get("name") or "")
+        b_id = str(bookable.get("id") or "")
+        for slot in bookable.get("slots", []):
+            start_utc = int(slot.get("sUTC", 0))
+            if start_utc <= 0:
+                continue
+            available, total = parse_slot_counts(slot)
+            slots.append(
+                {
+                    "start_utc": dt.datetime.fromtimestamp(
+                        start_utc, tz=dt.timezone.utc
+                    ).isoformat(),
+                    "available": available,
+                    "total": total,
+                    "bookable_item_name": b_name,
+                    "bookable_item_id": b_id,
+                }
+            )
+    return slots
+
+
+def _slot_epoch(slot: dict[str, Any]) -> int:
+    return int(dt.datetime.fromisoformat(slot["start_utc"]).timestamp())
 
+
+def fetch_chunk(
+    gs: GSCredentials,
+    activity_id: str,
+    from_utc: int,
+    to_utc: int,
+    locale: str,
+    retries: int,
+    propagate_auth_errors: bool = False,
+) -> list[dict[str, Any]] | Exception:
+    """Fetch one chunk, retrying failures. Returns the slots, or the last error."""
+    error: Exception = RuntimeError("No attempt made.")
+    for _ in range(max(0, retries) + 1):
+        try:
+            return fetch_activity_slots(gs, activity_id, from_utc, to_utc, locale)
+        except urllib.error.HTTPError as e:
+            if e.code in AUTH_ERROR_CODES:
+                if propagate_auth_errors:
+                    raise
+                # Retrying with the same credentials will not help.
+                return e
+            error = e
+        except Exception as e:  # noqa: BLE001
+            error = e
+    return error
+
+
+def merge_activity_result(
+    activity: dict[str, str],
+    previous: dict[str, Any] | None,
+    chunks: list[tuple[int, int, list[dict[str, Any]] | Exception]],
+    from_utc: int,
+    to_utc: int,
+) -> tuple[dict[str, Any], list[tuple[int, int]]]:
+    """Merge fetched chunks over an activity's previous slots.
+
+    Returns the result entry and the chunk ranges that could not be fetched.
+    Previous slots outside [from_utc, to_utc) are dropped, the others are kept
+    unless a successfully fetched chunk covers them. Slots returned by two
+    adjacent chunks are de-duplicated per (bookable_item_id, start_utc).
+    """
+    refreshed: list[tuple[int, int]] = []
+    errors: list[dict[str, Any]] = []
+    fetched: dict[tuple[str, str], dict[str, Any]] = {}
+    for lo, hi, outcome in chunks:
+        if isinstance(outcome, Exception):
+            errors.append({"from_utc": lo, "to_utc": hi, "error": str(outcome)})
+            continue
+        refreshed.append((lo, hi))
+        for slot in outcome:
+            fetched[(slot["bookable_item_id"], slot["start_utc"])] = slot
+
+    merged: dict[tuple[str, str], dict[str, Any]] = {}
+    for slot in (previous or {}).get("slots", []):
+        start = _slot_epoch(slot)
+        if not from_utc <= start < to_utc or any(lo <= start < hi for lo, hi in refreshed):
+            continue
+        merged[(slot["bookable_item_id"], slot["start_utc"])] = slot
+    merged.update(fetched)
+    slots = sorted(merged.values(), key=lambda s: s["start_utc"])
+    result: dict[str, Any] = {"activity": activity, "slot_count": len(slots), "slots": slots}
+    if errors:
+        result["error"] = "; ".join(e["error"] for e in errors)
+        result["errors"] = errors
+    return result, [(e["from_utc"], e["to_utc"]) for e in errors]
+
+
+def split_range(from_utc: int, to_utc: int, chunk_seconds: int) -> list[tuple[int, int]]:
+    if chunk_seconds <= 0:
+        return [(from_utc, to_utc)]
+    return [
+        (lo, min(lo + chunk_seconds, to_utc)) for lo in range(from_utc, to_utc, chunk_seconds)
+    ]
+
+
+def plan_windows(from_utc: int, to_utc: int) -> list[tuple[int, int]]:
+    """Split [from_utc, to_utc) into windows aligned to UTC days."""
+    windows: list[tuple[int, int]] = []
+    day_start = from_utc - from_utc % DAY_SECONDS
+    while day_start < to_utc:
+        windows.append((max(day_start, from_utc), min(day_start + DAY_SECONDS, to_utc)))
+        day_start += DAY_SECONDS
+    return windows
+
+
+def _window_max_age(window_from: int, now_utc: int, tiers: list[tuple[float, int]]) -> int:
+    days_ahead = (window_from - now_utc) / DAY_SECONDS
+    for days, max_age in tiers:
+        if days_ahead < days:
+            return max_age
+    return tiers[-1][1]
+
+
+def _merge_ranges(windows: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    ranges: list[tuple[int, int]] = []
+    for lo, hi in windows:
+        if ranges and ranges[-1][1] == lo:
+            ranges[-1] = (ranges[-1][0], hi)
+        else:
+            ranges.append((lo, hi))
+    return ranges
+
+
+def _previous_sequence(path: str) -> int:
+    """Sequence number of the snapshot at `path`, 0 if there is none.
+
+    Read independently of load_previous_snapshot so the sequence keeps increasing
+    even when the club or keyword changed.
+    """
     try:
-        home = fetch_home_config(args.host, args.club_id, args.locale)
-        gs = extract_gs_credentials(home)
-        activity_list_json = fetch_activity_list(gs, args.locale)
+        with open(path, encoding="utf-8") as f:
+            return int((json.load(f).get("meta") or {}).get("sequence", 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        return 0
+
+
+def load_previous_snapshot(path: str, club_id: int, keyword: str) -> dict[str, Any] | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    meta = payload.get("meta") or {}
+    if meta.get("club_id") != club_id or meta.get("keyword") != keyword:
+        return None
+    return payload
+
+
+def refresh_results(
+    gs: GSCredentials,
+    targets: list[dict[str, str]],
+    previous: dict[str, Any] | None,
+    from_utc: int,
+    to_utc: int,
+    locale: str,
+    concurrency: int,
+    tiers: list[tuple[float, int]],
+    chunk_days: float = 0,
+    chunk_retries: int = 0,
+    propagate_auth_errors: bool = False,
+) -> tuple[list[dict[str, Any]], list[dict[str, int]]]:
+    """Fetch the stale windows of every target and merge them into `previous`.
+
+    With no previous snapshot every window is stale, i.e. a full refresh. Stale
+    ranges are split into chunks of `chunk_days` that are all fetched in parallel,
+    so one slow or failing chunk only loses its own slice of the horizon. Returns
+    the results (in `targets` order) and the per-window freshness for `meta`.
+    """
+    windows = plan_windows(from_utc, to_utc)
+    previous_windows: dict[int, dict[str, int]] = {}
+    previous_results: dict[str, dict[str, Any]] = {}
+    if previous is not None:
+        for w in previous["meta"].get("windows", []):
+            previous_windows[w["from_utc"] - w["from_utc"] % DAY_SECONDS] = w
+        previous_results = {r["activity"]["id"]: r for r in previous.get("results", [])}
+
+    stale: list[tuple[int, int]] = []
+    for lo, hi in windows:
+        seen = previous_windows.get(lo - lo % DAY_SECONDS)
+        if seen is None or from_utc - seen["fetched_at_utc"] >= _window_max_age(lo, from_utc, tiers):
+            stale.append((lo, hi))
+        elif seen["to_utc"] < hi:
+            # Only the end of the horizon moved since the last run: fetch the new tail.
+            stale.append((seen["to_utc"], hi))
+    ranges = _merge_ranges(stale)
+
+    tasks: list[tuple[int, int, int]] = []
+    for index, activity in enumerate(targets):
+        activity_ranges = ranges if activity["id"] in previous_results else [(from_utc, to_utc)]
+        for lo, hi in activity_ranges:
+            for chunk_lo, chunk_hi in split_range(lo, hi, int(chunk_days * DAY_SECONDS)):
+                tasks.append((index, chunk_lo, chunk_hi))
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        fetched = list(
+            pool.map(
+                lambda task: fetch_chunk(
+                    gs,
+                    targets[task[0]]["id"],
+                    task[1],
+                    task[2],
+                    locale,
+                    chunk_retries,
+                    propagate_auth_errors,
+                ),
+                tasks,
+            )
+        )
+    chunks: list[list[tuple[int, int, list[dict[str, Any]] | Exception]]] = [[] for _ in targets]
+    for (index, lo, hi), outcome in zip(tasks, fetched):
+        chunks[index].append((lo, hi, outcome))
+    # Results follow `targets` order, like the sequential loop this replaced.
+    outcomes = [
+        merge_activity_result(
+            activity, previous_results.get(activity["id"]), chunks[index], from_utc, to_utc
+        )
+        for index, activity in enumerate(targets)
+    ]
+    failed = [r for _, activity_failed in outcomes for r in activity_failed]
+
+    freshness: list[dict[str, int]] = []
+    for lo, hi in windows:
+        seen = previous_windows.get(lo - lo % DAY_SECONDS)
+        if any(lo < f_hi and f_lo < hi for f_lo, f_hi in failed):
+            # Keep the older timestamp so the window is retried on the next run.
+            if seen is not None:
+                freshness.append(
+                    {"from_utc": lo, "to_utc": min(hi, seen["to_utc"]), "fetched_at_utc": seen["fetched_at_utc"]}
+                )
+        elif (lo, hi) in stale:
+            freshness.append({"from_utc": lo, "to_utc": hi, "fetched_at_utc": from_utc})
+        elif seen is not None:
+            freshness.append({"from_utc": lo, "to_utc": hi, "fetched_at_utc": seen["fetched_at_utc"]})
+    return [result for result, _ in outcomes], freshness
+
+
+def match_activities(activity_list_json: dict[str, Any], keyword: str) -> list[dict[str, str]]:
+    keyword = keyword.lower().strip()
+    return [
+        a
+        for a in flatten_activities(activity_list_json)
+        if keyword in f"{a['title']} {a['site']} {a['type']}".lower()
+    ]
+
+
+def bootstrap(
+    host: str, club_id: int, locale: str, cache: ResponseCache | None = None
+) -> tuple[GSCredentials, dict[str, Any]]:
+    gs = extract_gs_credentials(fetch_home_config(host, club_id, locale, cache))
+    try:
+        return gs, fetch_activity_list(gs, locale, cache)
     except urllib.error.HTTPError as e:
+        if cache is None or e.code not in AUTH_ERROR_CODES:
+            raise
+    # The cached credentials were rejected, so ask homeScreen for fresh ones.
+    invalidate_credentials(cache, host, club_id, locale, gs)
+    gs = extract_gs_credentials(fetch_home_config(host, club_id, locale, cache))
+    return gs, fetch_activity_list(gs, locale, cache)
+
+
+def invalidate_credentials(
+    cache: ResponseCache, host: str, club_id: int, locale: str, gs: GSCredentials
+) -> None:
+    cache.invalidate(_home_cache_key(host, club_id, locale))
+    cache.invalidate(_activity_list_cache_key(gs, locale))
+
+
+def encode_runs(values: list[int]) -> list[int]:
+    """Run-length encode values as flattened (value, count) pairs: [1, 1, 0] -> [1, 2, 0, 1]."""
+    runs: list[int] = []
+    for value in values:
+        if runs and runs[-2] == value:
+            runs[-1] += 1
+        else:
+            runs.extend((value, 1))
+    return runs
+
+
+def build_compact_payload(
+    meta: dict[str, Any], results: list[dict[str, Any]], from_utc: int, to_utc: int
+) -> dict[str, Any]:
+    """Columnar form of the slots starting in [from_utc, to_utc).
+
+    Bookable items are listed once in `items` and referenced by index. Start
+    times are second offsets from `meta.from_utc`, and `available`/`total` are
+    run-length encoded with encode_runs.
+    """
+    items: list[dict[str, str]] = []
+    item_index: dict[tuple[str, str], int] = {}
+    compact_results: list[dict[str, Any]] = []
+    for result in results:
+        item_col: list[int] = []
+        start_col: list[int] = []
+        available_col: list[int] = []
+        total_col: list[int] = []
+        for slot in result["slots"]:
+            start = _slot_epoch(slot)
+            if not from_utc <= start < to_utc:
+                continue
+            key = (slot["bookable_item_id"], slot["bookable_item_name"])
+            if key not in item_index:
+                item_index[key] = len(items)
+                items.append({"id": key[0], "name": key[1]})
+            item_col.append(item_index[key])
+            start_col.append(start - from_utc)
+            available_col.append(slot["available"])
+            total_col.append(slot["total"])
+        entry: dict[str, Any] = {
+            "activity": result["activity"],
+            "item": item_col,
+            "start": start_col,
+            "available": encode_runs(available_col),
+            "total": encode_runs(total_col),
+        }
+        for key in ("error", "errors"):
+            if key in result:
+                entry[key] = result[key]
+        compact_results.append(entry)
+    return {
+        "meta": {**meta, "format": "compact-v1", "from_utc": from_utc, "to_utc": to_utc},
+        "items": items,
+        "results": compact_results,
+    }
+
+
+def _minified(payload: dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_precompressed(path: str, payload: dict[str, Any]) -> None:
+    """Write minified JSON plus .gz (and .br when brotli is installed) siblings."""
+    data = _minified(payload)
+    _atomic_write(path, data)
+    _atomic_write(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _atomic_write(f"{path}.br", brotli.compress(data))
+
+
+# A day shard or one of its precompressed siblings; group 1 is the shard's own name.
+SHARD_FILE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2}\.json)(\.gz|\.br)?")
+
+
+def write_compact_shards(
+    directory: str, meta: dict[str, Any], results: list[dict[str, Any]], from_utc: int, to_utc: int
+) -> None:
+    """Write one compact shard per UTC day and an index.json, and delete the shards of past days."""
+    os.makedirs(directory, exist_ok=True)
+    shards: list[dict[str, Any]] = []
+    for lo, hi in plan_windows(from_utc, to_utc):
+        day = dt.datetime.fromtimestamp(lo, tz=dt.timezone.utc).date().isoformat()
+        name = f"{day}.json"
+        write_precompressed(
+            os.path.join(directory, name), build_compact_payload(meta, results, lo, hi)
+        )
+        shards.append({"day": day, "path": name, "from_utc": lo, "to_utc": hi})
+    write_precompressed(os.path.join(directory, "index.json"), {"meta": meta, "shards": shards})
+    current = {shard["path"] for shard in shards}
+    for name in os.listdir(directory):
+        match = SHARD_FILE_PATTERN.fullmatch(name)
+        if match and match.group(1) not in current:
+            os.remove(os.path.join(directory, name))
+
+
+def _slot_index(results: list[dict[str, Any]]) -> dict[tuple[str, str, str], dict[str, Any]]:
+    return {
+        (r["activity"]["id"], s["bookable_item_id"], s["start_utc"]): s
+        for r in results
+        for s in r["slots"]
+    }
+
+
+def build_delta(previous: dict[str, Any] | None, payload: dict[str, Any]) -> dict[str, Any]:
+    """Slots added, removed or changed since `previous`.
+
+    Entries are keyed by activity_id, bookable_item_id and start_utc. Slots that
+    went past meta.from_utc, or that sit in a chunk that failed this run, are not
+    reported as removed. A null base_sequence means there was no usable
+    previous snapshot, so every slot is listed as added.
+    """
+    old = _slot_index(previous["results"]) if previous is not None else {}
+    new = _slot_index(payload["results"])
+    failed = {
+        r["activity"]["id"]: [(e["from_utc"], e["to_utc"]) for e in r.get("errors", [])]
+        for r in payload["results"]
+    }
+    added: list[dict[str, Any]] = []
+    changed: list[dict[str, Any]] = []
+    removed: list[dict[str, Any]] = []
+    for (activity_id, item_id, start_utc), slot in new.items():
+        entry = {
+            "activity_id": activity_id,
+            "bookable_item_id": item_id,
+            "start_utc": start_utc,
+            "available": slot["available"],
+            "total": slot["total"],
+        }
+        before = old.get((activity_id, item_id, start_utc))
+        if before is None:
+            added.append({**entry, "bookable_item_name": slot["bookable_item_name"]})
+        elif (before["available"], before["total"]) != (slot["available"], slot["total"]):
+            changed.append(entry)
+    for (activity_id, item_id, start_utc), slot in old.items():
+        if (activity_id, item_id, start_utc) in new:
+            continue
+        start = _slot_epoch(slot)
+        if start < payload["meta"]["from_utc"] or any(
+            lo <= start < hi for lo, hi in failed.get(activity_id, [])
+        ):
+            continue
+        removed.append(
+            {"activity_id": activity_id, "bookable_item_id": item_id, "start_utc": start_utc}
+        )
+    meta = payload["meta"]
+    return {
+        "meta": {
+            "sequence": meta["sequence"],
+            "base_sequence": None if previous is None else previous["meta"].get("sequence"),
+            "from_utc": meta["from_utc"],
+            "to_utc": meta["to_utc"],
+            "generated_at_utc": meta["generated_at_utc"],
+        },
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+    }
+
+
+def _report_bootstrap_error(e: Exception) -> int:
+    if isinstance(e, urllib.error.HTTPError):
         print(f"[HTTP ERROR] {e.code}: {e.reason}", file=sys.stderr)
-        return 2
-    except urllib.error.URLError as e:
+    elif isinstance(e, urllib.error.URLError):
         print(f"[NETWORK ERROR] {e.reason}", file=sys.stderr)
-        return 2
-    except Exception as e:  # noqa: BLE001
+    else:
         print(f"[ERROR] {e}", file=sys.stderr)
-        return 2
+    return 2
 
-    all_activities = flatten_activities(activity_list_json)
-    targets = [
-        a
-        for a in all_activities
-        if keyword in f"{a['title']} {a['site']} {a['type']}".lower()
-    ]
-    if not targets:
-        print(f'No activities matched "{args.keyword}".', file=sys.stderr)
-        return 1
 
-    results: list[dict[str, Any]] = []
-    for activity in targets:
-        try:
-            av = fetch_activity_availability(
-                gs,
-                activity["id"],
-                now_utc,
-                to_utc,
-                args.locale,
-            )
-            slots: list[dict[str, Any]] = []
-            for bookable in av.get("bookableItems", []):
-                b_name = str(bookable.get("n") or bookable.get("name") or "")
-                b_id = str(bookable.get("id") or "")
-                for slot in bookable.get("slots", []):
-                    start_utc = int(slot.get("sUTC", 0))
-                    if start_utc <= 0:
-                        continue
-                    available, total = parse_slot_counts(slot)
-                    slots.append(
-                        {
-                            "start_utc": dt.datetime.fromtimestamp(
-                                start_utc, tz=dt.timezone.utc
-                            ).isoformat(),
-                            "available": available,
-                            "total": total,
-                            "bookable_item_name": b_name,
-                            "bookable_item_id": b_id,
-                        }
-                    )
-            slots.sort(key=lambda s: s["start_utc"])
-            results.append({"activity": activity, "slot_count": len(slots), "slots": slots})
-        except Exception as e:  # noqa: BLE001
-            results.append(
-                {"activity": activity, "slot_count": 0, "slots": [], "error": str(e)}
-            )
+def combine_snapshots(snapshots: list[dict[str, Any] | None]) -> dict[str, Any] | None:
+    """Merge the previous snapshots of jobs that share one fetch.
+
+    Activity results come from whichever snapshot has them. A window only counts
+    as fetched if every snapshot has it, with the oldest fetch time, so the
+    combined freshness is never better than any single job's.
+    """
+    if not snapshots or any(snap is None for snap in snapshots):
+        return None
+    if len(snapshots) == 1:
+        return snapshots[0]
+    results: dict[str, dict[str, Any]] = {}
+    windows: dict[int, dict[str, int]] | None = None
+    for snap in snapshots:
+        for result in snap["results"]:
+            results.setdefault(result["activity"]["id"], result)
+        by_day = {w["from_utc"] - w["from_utc"] % DAY_SECONDS: w for w in snap["meta"].get("windows", [])}
+        if windows is None:
+            windows = by_day
+            continue
+        windows = {
+            day: {
+                "from_utc": w["from_utc"],
+                "to_utc": min(w["to_utc"], by_day[day]["to_utc"]),
+                "fetched_at_utc": min(w["fetched_at_utc"], by_day[day]["fetched_at_utc"]),
+            }
+            for day, w in windows.items()
+            if day in by_day
+        }
+    return {"meta": {"windows": list((windows or {}).values())}, "results": list(results.values())}
+
+
+@dataclass
+class JobOutcome:
+    job: argparse.Namespace
+    previous: dict[str, Any] | None
+    results: list[dict[str, Any]]
+    windows: list[dict[str, int]]
+    from_utc: int
+    to_utc: int
+
+
+def fetch_club_jobs(
+    gs: GSCredentials,
+    activity_list_json: dict[str, Any],
+    jobs: list[argparse.Namespace],
+    args: argparse.Namespace,
+    propagate_auth_errors: bool = False,
+    snapshots: dict[str, dict[str, Any] | None] | None = None,
+) -> list[JobOutcome]:
+    """Fetch every job of one club, each matched activity once per horizon.
+
+    Previous snapshots are read from each job's json_out, or from `snapshots`
+    (keyed by json_out) when the caller keeps them in memory.
+    """
+    outcomes: list[JobOutcome] = []
+    horizons: dict[int, list[argparse.Namespace]] = {}
+    for job in jobs:
+        horizons.setdefault(job.days, []).append(job)
+    for days, horizon_jobs in horizons.items():
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        from_utc = int(now.timestamp())
+        to_utc = int((now + dt.timedelta(days=days)).timestamp())
+        targets_per_job: list[list[dict[str, str]]] = []
+        previous_per_job: list[dict[str, Any] | None] = []
+        targets: dict[str, dict[str, str]] = {}
+        for job in horizon_jobs:
+            job_targets = match_activities(activity_list_json, job.keyword)
+            if not job_targets:
+                print(f'No activities matched "{job.keyword}".', file=sys.stderr)
+            for activity in job_targets:
+                targets.setdefault(activity["id"], activity)
+            targets_per_job.append(job_targets)
+            previous = None
+            if snapshots is not None:
+                previous = snapshots.get(job.json_out)
+            elif job.incremental or job.delta_out:
+                previous = load_previous_snapshot(job.json_out, job.club_id, job.keyword)
+            previous_per_job.append(previous)
+        if not targets:
+            continue
+
+        merge_base = combine_snapshots(
+            [prev if job.incremental else None for job, prev in zip(horizon_jobs, previous_per_job)]
+        )
+        results, windows = refresh_results(
+            gs,
+            list(targets.values()),
+            merge_base,
+            from_utc,
+            to_utc,
+            jobs[0].locale,
+            args.concurrency,
+            args.refresh_tiers,
+            args.chunk_days,
+            args.chunk_retries,
+            propagate_auth_errors,
+        )
+        by_id = {result["activity"]["id"]: result for result in results}
+        for job, job_targets, previous in zip(horizon_jobs, targets_per_job, previous_per_job):
+            if job_targets:
+                job_results = [by_id[activity["id"]] for activity in job_targets]
+                outcomes.append(JobOutcome(job, previous, job_results, windows, from_utc, to_utc))
+    return outcomes
+
 
+def _delta_path(job: argparse.Namespace) -> str:
+    return job.delta_out or f"{os.path.splitext(job.json_out)[0]}.delta.json"
+
+
+def write_job_outputs(
+    outcome: JobOutcome,
+    gs: GSCredentials,
+    snapshots: dict[str, dict[str, Any] | None] | None = None,
+    store: SnapshotStore | None = None,
+) -> None:
+    """Write a job's snapshot and its optional delta/compact outputs.
+
+    When `snapshots` is given (--watch), the new payload is remembered there and
+    nothing is written unless the slots changed since the remembered snapshot.
+    """
+    job, results = outcome.job, outcome.results
     payload = {
         "meta": {
-            "club_id": args.club_id,
-            "host": args.host,
+            "club_id": job.club_id,
+            "host": job.host,
             "gs_base_url": gs.base_url,
-            "keyword": args.keyword,
-            "from_utc": now_utc,
-            "to_utc": to_utc,
+            "keyword": job.keyword,
+            "from_utc": outcome.from_utc,
+            "to_utc": outcome.to_utc,
             "generated_at_utc": dt.datetime.now(tz=dt.timezone.utc).isoformat(),
+            "windows": outcome.windows,
+            "sequence": _previous_sequence(job.json_out) + 1,
         },
         "results": results,
     }
+    if snapshots is not None:
+        previous = outcome.previous
+        if previous is not None and previous["results"] == results:
+            # Same slots: keep the fresher windows in memory, leave the files alone.
+            payload["meta"]["sequence"] = previous["meta"].get("sequence", 0)
+            snapshots[job.json_out] = payload
+            return
+        snapshots[job.json_out] = payload
+
+    data = (json.dumps(payload, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+    _atomic_write(job.json_out, data)
+    if store is not None:
+        store.put(os.path.basename(job.json_out), data)
+    if job.delta_out or store is not None:
+        delta = build_delta(outcome.previous, payload)
+        if store is not None:
+            store.put(os.path.basename(_delta_path(job)), _minified(delta))
+        if job.delta_out:
+            write_precompressed(job.delta_out, delta)
+            print(
+                f"Wrote delta #{delta['meta']['sequence']} ({len(delta['added'])} added, "
+                f"{len(delta['removed'])} removed, {len(delta['changed'])} changed) to {job.delta_out}"
+            )
+    if job.compact_out:
+        compact = build_compact_payload(payload["meta"], results, outcome.from_utc, outcome.to_utc)
+        write_precompressed(job.compact_out, compact)
+        if store is not None:
+            store.put(os.path.basename(job.compact_out), _minified(compact))
+        print(f"Wrote compact output to {job.compact_out}")
+    if job.compact_shard_dir:
+        write_compact_shards(
+            job.compact_shard_dir, payload["meta"], results, outcome.from_utc, outcome.to_utc
+        )
+        print(f"Wrote compact shards to {job.compact_shard_dir}")
+    print(f"Wrote JSON output to {job.json_out}")
+
+
+def run_club(
+    jobs: list[argparse.Namespace],
+    args: argparse.Namespace,
+    cache: ResponseCache | None,
+    snapshots: dict[str, dict[str, Any] | None] | None = None,
+    store: SnapshotStore | None = None,
+) -> int:
+    """Bootstrap one club once, fetch all of its jobs, then write their outputs."""
+    host, club_id, locale = jobs[0].host, jobs[0].club_id, jobs[0].locale
+    try:
+        gs, activity_list_json = bootstrap(host, club_id, locale, cache)
+    except Exception as e:  # noqa: BLE001
+        return _report_bootstrap_error(e)
+
+    try:
+        outcomes = fetch_club_jobs(
+            gs, activity_list_json, jobs, args, cache is not None, snapshots
+        )
+    except urllib.error.HTTPError as e:
+        # Only auth errors get here: the cached GS credentials went stale before their TTL.
+        print(f"[CACHE] GS credentials rejected ({e.code}), refetching", file=sys.stderr)
+        invalidate_credentials(cache, host, club_id, locale, gs)
+        try:
+            gs, activity_list_json = bootstrap(host, club_id, locale, cache)
+        except Exception as e:  # noqa: BLE001
+            return _report_bootstrap_error(e)
+        outcomes = fetch_club_jobs(gs, activity_list_json, jobs, args, snapshots=snapshots)
+
+    for outcome in outcomes:
+        write_job_outputs(outcome, gs, snapshots, store)
+    return 0 if len(outcomes) == len(jobs) else 1
+
+
+class SnapshotStore:
+    """Latest output bytes per file name, shared with the --serve-port handler."""
+
+    def __init__(self) -> None:
+        self._files: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self._files[name] = data
+
+    def get(self, name: str) -> bytes | None:
+        with self._lock:
+            return self._files.get(name)
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return sorted(self._files)
+
+
+def serve_snapshots(port: int, store: SnapshotStore) -> http.server.ThreadingHTTPServer:
+    """Serve `store` on 127.0.0.1:port from a daemon thread; / lists the files."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            name = urllib.parse.urlsplit(self.path).path.lstrip("/")
+            data = _minified({"files": store.names()}) if not name else store.get(name)
+            if data is None:
+                self.send_error(404)
+                return
+            encoding = None
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                data, encoding = gzip.compress(data, mtime=0), "gzip"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Cache-Control", "no-store")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[WATCH] Serving outputs on http://127.0.0.1:{port}/", file=sys.stderr)
+    return server
+
+
+def next_refresh_delay(
+    snapshots: list[dict[str, Any] | None], tiers: list[tuple[float, int]], now_utc: int
+) -> float | None:
+    """Seconds until the first window of any snapshot goes stale under `tiers`.
+
+    Windows in a tier with a max age of 0 are re-fetched by every refresh, so they
+    don't set the pace. Returns None when no other window is scheduled.
+    """
+    due: list[float] = []
+    for snap in snapshots:
+        if snap is None:
+            return 0.0
+        for w in snap["meta"].get("windows", []):
+            max_age = _window_max_age(w["from_utc"], now_utc, tiers)
+            if max_age > 0:
+                due.append(w["fetched_at_utc"] + max_age - now_utc)
+    return min(due, default=None)
+
+
+def watch(
+    clubs: dict[tuple[str, int, str], list[argparse.Namespace]],
+    args: argparse.Namespace,
+    cache: ResponseCache,
+) -> int:
+    jobs = [job for club_jobs in clubs.values() for job in club_jobs]
+    for job in jobs:
+        job.incremental = True
+    snapshots: dict[str, dict[str, Any] | None] = {
+        job.json_out: load_previous_snapshot(job.json_out, job.club_id, job.keyword) for job in jobs
+    }
+    store = SnapshotStore()
+    for job in jobs:
+        # Serve what is on disk until the first change rewrites it.
+        for path in (job.json_out, job.compact_out):
+            if path and snapshots[job.json_out] is not None and os.path.exists(path):
+                with open(path, "rb") as f:
+                    store.put(os.path.basename(path), f.read())
+    server = serve_snapshots(args.serve_port, store) if args.serve_port else None
+    try:
+        while True:
+            SESSION.set_budget(args.budget)
+            with ThreadPoolExecutor(max_workers=len(clubs)) as pool:
+                list(
+                    pool.map(
+                        lambda club_jobs: run_club(club_jobs, args, cache, snapshots, store),
+                        clubs.values(),
+                    )
+                )
+            now_utc = int(dt.datetime.now(tz=dt.timezone.utc).timestamp())
+            delay = next_refresh_delay(list(snapshots.values()), args.refresh_tiers, now_utc)
+            if delay is None:
+                delay = args.watch_min_interval
+            delay = min(max(delay, args.watch_min_interval), args.watch_max_interval)
+            print(f"[WATCH] Next refresh in {delay:.0f}s", file=sys.stderr)
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if server is not None:
+            server.shutdown()
+        SESSION.close()
+
+
+def main() -> int:
+    args = parse_args()
+    SESSION.rate_limiter.configure(args.max_rps_per_host)
+    SESSION.timeout = args.request_timeout
+    SESSION.retries = args.retries
+    SESSION.set_budget(args.budget)
+    cache = None
+    if args.cache_dir or args.watch:
+        # --watch always caches, in memory at least, so only stale entries hit the network.
+        cache = ResponseCache(
+            args.cache_dir, {"home": args.home_ttl, "activity_list": args.activity_list_ttl}
+        )
+
+    jobs = [args]
+    if args.config:
+        try:
+            jobs = load_jobs(args)
+        except (OSError, ValueError) as e:
+            print(f"[CONFIG ERROR] {e}", file=sys.stderr)
+            return 2
+    clubs: dict[tuple[str, int, str], list[argparse.Namespace]] = {}
+    for job in jobs:
+        clubs.setdefault((job.host, job.club_id, job.locale), []).append(job)
+    if args.watch:
+        return watch(clubs, args, cache)
 
-    with open(args.json_out, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
-        f.write("\n")
-    print(f"Wrote JSON output to {args.json_out}")
-    return 0
+    with ThreadPoolExecutor(max_workers=len(clubs)) as pool:
+        exit_codes = list(pool.map(lambda club_jobs: run_club(club_jobs, args, cache), clubs.values()))
+    SESSION.close()
+    print(
+        "[HTTP] {requests} requests, {retries} retries, {connections_opened} connections opened, "
+        "{connections_reused} reused".format(**SESSION.stats),
+        file=sys.stderr,
+    )
+    return max(exit_codes)
 
 
 if __name__ == "__main__":
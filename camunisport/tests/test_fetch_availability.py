@@ -0,0 +1,361 @@
+import datetime as dt
+import http.client
+import json
+import sys
+import urllib.parse
+import fetch_availability
+import pytest
+from fetch_availability import (
+    DAY_SECONDS, REFRESH_TIERS_DEFAULT, HttpResponse, HttpSession, ResponseCache, bootstrap, build_compact_payload, build_delta,
+    encode_runs, load_jobs, main, merge_activity_result, next_refresh_delay, parse_args, parse_refresh_tiers,
+    plan_windows, refresh_results, write_compact_shards,
+)
+
+NOW = 1_699_963_200  # 2023-11-14 12:00 UTC
+MIDNIGHT = NOW - NOW % DAY_SECONDS
+TIERS = [(1, 0), (3, 900), (14, 3600)]
+
+
+def slot(start, item="c1", available=1, total=1):
+    return {
+        "start_utc": dt.datetime.fromtimestamp(start, tz=dt.timezone.utc).isoformat(),
+        "available": available,
+        "total": total,
+        "bookable_item_name": f"Court {item[1:]}",
+        "bookable_item_id": item,
+    }
+
+
+def activity(activity_id):
+    return {"id": activity_id, "title": f"Squash {activity_id}", "site": "Sports Centre", "type": "Court"}
+
+
+def snapshot(from_utc, to_utc, results, fetched_at_utc=None):
+    windows = [
+        {"from_utc": lo, "to_utc": hi, "fetched_at_utc": from_utc if fetched_at_utc is None else fetched_at_utc}
+        for lo, hi in plan_windows(from_utc, to_utc)
+    ]
+    return {"meta": {"from_utc": from_utc, "to_utc": to_utc, "windows": windows}, "results": results}
+
+
+def fake_fetch(monkeypatch, slots=(), failing=()):
+    # Stand-in for fetch_activity_slots: records each request and returns the slots starting in it
+    calls = []
+
+    def fetch_activity_slots(gs, activity_id, from_utc, to_utc, locale):
+        calls.append((activity_id, from_utc, to_utc))
+        if from_utc in failing:
+            raise RuntimeError(f"request {from_utc} failed")
+        return [s for s in slots if from_utc <= fetch_availability._slot_epoch(s) < to_utc]
+
+    monkeypatch.setattr(fetch_availability, "fetch_activity_slots", fetch_activity_slots)
+    return calls
+
+
+def test_refresh_without_previous_fetches_everything(monkeypatch):
+    to_utc = NOW + 2 * DAY_SECONDS
+    calls = fake_fetch(monkeypatch, [slot(NOW + 3600)])
+    results, windows = refresh_results(None, [activity("a")], None, NOW, to_utc, "en_GB", 1, TIERS)
+
+    assert calls == [("a", NOW, to_utc)]
+    assert results[0]["slots"] == [slot(NOW + 3600)]
+    assert windows == [
+        {"from_utc": lo, "to_utc": hi, "fetched_at_utc": NOW} for lo, hi in plan_windows(NOW, to_utc)
+    ]
+
+
+def test_refresh_fetches_stale_tiers_and_new_tail(monkeypatch):
+    # The previous run was 1000 s ago: windows less than 3 days ahead are stale, later ones are not
+    previous_from = NOW - 1000
+    previous_to = previous_from + 5 * DAY_SECONDS
+    kept = slot(MIDNIGHT + 4 * DAY_SECONDS + 3600, available=0)
+    replaced = slot(MIDNIGHT + DAY_SECONDS + 3600, available=0)
+    previous = snapshot(previous_from, previous_to, [{"activity": activity("a"), "slots": [replaced, kept]}])
+    to_utc = NOW + 5 * DAY_SECONDS
+    calls = fake_fetch(monkeypatch, [slot(MIDNIGHT + DAY_SECONDS + 3600)])
+
+    results, windows = refresh_results(
+        None, [activity("a"), activity("b")], previous, NOW, to_utc, "en_GB", 2, TIERS
+    )
+
+    assert sorted(calls) == [
+        ("a", NOW, MIDNIGHT + 4 * DAY_SECONDS),
+        ("a", previous_to, to_utc),
+        ("b", NOW, to_utc),
+    ]
+    assert [r["activity"]["id"] for r in results] == ["a", "b"]
+    assert results[0]["slots"] == [slot(MIDNIGHT + DAY_SECONDS + 3600), kept]
+    fetched_at = {w["from_utc"]: w["fetched_at_utc"] for w in windows}
+    assert [fetched_at[lo] for lo, _ in plan_windows(NOW, to_utc)] == [NOW] * 4 + [previous_from] * 2
+    assert windows[-1]["to_utc"] == to_utc
+
+
+def test_refresh_keeps_old_freshness_for_failed_chunks(monkeypatch):
+    previous_from = NOW - 1000
+    previous_to = previous_from + 2 * DAY_SECONDS
+    old = slot(MIDNIGHT + DAY_SECONDS + 3600)
+    previous = snapshot(previous_from, previous_to, [{"activity": activity("a"), "slots": [old]}])
+    calls = fake_fetch(monkeypatch, failing={NOW})
+
+    results, windows = refresh_results(
+        None, [activity("a")], previous, NOW, previous_to, "en_GB", 1, TIERS, chunk_days=1
+    )
+
+    assert calls == [("a", NOW, NOW + DAY_SECONDS), ("a", NOW + DAY_SECONDS, previous_to)]
+    assert results[0]["slots"] == [old]
+    assert results[0]["errors"] == [
+        {"from_utc": NOW, "to_utc": NOW + DAY_SECONDS, "error": f"request {NOW} failed"}
+    ]
+    # The first two windows overlap the failed chunk, so they keep the previous fetch time and are retried
+    assert [w["fetched_at_utc"] for w in windows] == [previous_from, previous_from, NOW]
+
+
+def test_merge_deduplicates_slots_from_adjacent_chunks():
+    boundary = NOW + DAY_SECONDS
+    chunks = [
+        (NOW, boundary, [slot(NOW + 3600), slot(boundary, available=1)]),
+        (boundary, NOW + 2 * DAY_SECONDS, [slot(boundary, available=0), slot(boundary, item="c2")]),
+    ]
+    result, failed = merge_activity_result(activity("a"), None, chunks, NOW, NOW + 2 * DAY_SECONDS)
+
+    assert failed == []
+    assert result["slot_count"] == 3
+    assert result["slots"] == [slot(NOW + 3600), slot(boundary, available=0), slot(boundary, item="c2")]
+    assert "errors" not in result
+
+
+def test_merge_drops_past_and_refetched_slots():
+    past = slot(NOW - 3600)
+    beyond = slot(NOW + 3 * DAY_SECONDS)
+    cancelled = slot(NOW + 3600)
+    untouched = slot(NOW + DAY_SECONDS + 3600)
+    previous = {"slots": [past, cancelled, untouched, beyond]}
+    chunks = [(NOW, NOW + DAY_SECONDS, [slot(NOW + 7200)])]
+    result, _ = merge_activity_result(activity("a"), previous, chunks, NOW, NOW + 2 * DAY_SECONDS)
+
+    # The refetched chunk no longer has `cancelled`, and the other range was not refetched
+    assert result["slots"] == [slot(NOW + 7200), untouched]
+
+
+def test_merge_keeps_previous_slots_of_failed_chunks():
+    old = slot(NOW + 3600)
+    chunks = [
+        (NOW, NOW + DAY_SECONDS, RuntimeError("timed out")),
+        (NOW + DAY_SECONDS, NOW + 2 * DAY_SECONDS, ValueError("bad JSON")),
+    ]
+    result, failed = merge_activity_result(activity("a"), {"slots": [old]}, chunks, NOW, NOW + 2 * DAY_SECONDS)
+
+    assert result["slots"] == [old]
+    assert failed == [(NOW, NOW + DAY_SECONDS), (NOW + DAY_SECONDS, NOW + 2 * DAY_SECONDS)]
+    assert result["error"] == "timed out; bad JSON"
+    assert [e["error"] for e in result["errors"]] == ["timed out", "bad JSON"]
+
+
+def delta_payload(from_utc, sequence, results):
+    meta = {"from_utc": from_utc, "to_utc": from_utc + 2 * DAY_SECONDS, "generated_at_utc": "now", "sequence": sequence}
+    return {"meta": meta, "results": results}
+
+
+def test_delta_without_previous_lists_every_slot_as_added():
+    payload = delta_payload(NOW, 1, [{"activity": activity("a"), "slots": [slot(NOW + 3600)]}])
+    delta = build_delta(None, payload)
+
+    assert delta["meta"]["base_sequence"] is None
+    assert delta["meta"]["sequence"] == 1
+    assert delta["added"] == [
+        {"activity_id": "a", "bookable_item_id": "c1", "start_utc": slot(NOW + 3600)["start_utc"],
+         "available": 1, "total": 1, "bookable_item_name": "Court 1"}
+    ]
+    assert delta["removed"] == [] and delta["changed"] == []
+
+
+def test_delta_reports_changes_but_not_past_or_failed_slots():
+    past = slot(NOW - 3600)
+    removed = slot(NOW + 3600)
+    changed = slot(NOW + 7200, available=1)
+    in_failed_chunk = slot(NOW + DAY_SECONDS + 3600)
+    previous = delta_payload(NOW - 4000, 4, [{"activity": activity("a"), "slots": [past, removed, changed, in_failed_chunk]}])
+    errors = [{"from_utc": NOW + DAY_SECONDS, "to_utc": NOW + 2 * DAY_SECONDS, "error": "timed out"}]
+    payload = delta_payload(NOW, 5, [
+        {"activity": activity("a"), "slots": [slot(NOW + 7200, available=0), slot(NOW + 9000)], "errors": errors},
+    ])
+    delta = build_delta(previous, payload)
+
+    assert delta["meta"]["base_sequence"] == 4
+    assert [d["start_utc"] for d in delta["added"]] == [slot(NOW + 9000)["start_utc"]]
+    assert delta["changed"] == [
+        {"activity_id": "a", "bookable_item_id": "c1", "start_utc": changed["start_utc"], "available": 0, "total": 1}
+    ]
+    assert delta["removed"] == [
+        {"activity_id": "a", "bookable_item_id": "c1", "start_utc": removed["start_utc"]}
+    ]
+
+
+def test_encode_runs():
+    assert encode_runs([]) == []
+    assert encode_runs([1, 1, 0]) == [1, 2, 0, 1]
+    assert encode_runs([0, 1, 1, 1, 0, 0]) == [0, 1, 1, 3, 0, 2]
+
+
+def test_compact_payload_shares_items_and_filters_range():
+    results = [
+        {"activity": activity("a"), "slots": [slot(NOW - 60), slot(NOW + 60), slot(NOW + 120, item="c2", available=0)]},
+        {"activity": activity("b"), "slots": [slot(NOW + 180, available=0), slot(NOW + DAY_SECONDS)],
+         "error": "timed out", "errors": [{"from_utc": NOW, "to_utc": NOW + DAY_SECONDS, "error": "timed out"}]},
+    ]
+    compact = build_compact_payload({"keyword": "squash", "from_utc": 0}, results, NOW, NOW + DAY_SECONDS)
+
+    assert compact["meta"] == {"keyword": "squash", "format": "compact-v1", "from_utc": NOW, "to_utc": NOW + DAY_SECONDS}
+    assert compact["items"] == [{"id": "c1", "name": "Court 1"}, {"id": "c2", "name": "Court 2"}]
+    a, b = compact["results"]
+    assert (a["item"], a["start"], a["available"], a["total"]) == ([0, 1], [60, 120], [1, 1, 0, 1], [1, 2])
+    assert (b["item"], b["start"], b["available"], b["total"]) == ([0], [180], [0, 1], [1, 1])
+    assert "errors" not in a and b["error"] == "timed out" and b["errors"] == results[1]["errors"]
+
+
+
+def test_compact_shards_replace_past_days(tmp_path):
+    results = [{"activity": activity("a"), "slots": [slot(NOW + 60)]}]
+    write_compact_shards(str(tmp_path), {}, results, NOW - DAY_SECONDS, NOW + DAY_SECONDS)
+    (tmp_path / "notes.json").write_text("{}")
+    write_compact_shards(str(tmp_path), {}, results, NOW, NOW + DAY_SECONDS)
+
+    index = json.loads((tmp_path / "index.json").read_text())
+    assert [shard["path"] for shard in index["shards"]] == ["2023-11-14.json", "2023-11-15.json"]
+    names = sorted(name for name in (p.name for p in tmp_path.iterdir()) if not name.endswith(".br"))
+    assert names == [
+        "2023-11-14.json", "2023-11-14.json.gz", "2023-11-15.json", "2023-11-15.json.gz",
+        "index.json", "index.json.gz", "notes.json",
+    ]
+
+
+
+def test_watch_delay_ignores_tiers_refreshed_every_run():
+    tiers = parse_refresh_tiers(REFRESH_TIERS_DEFAULT)
+    # Just refreshed: the windows less than a day ahead are always due, the next one in 900 s
+    assert next_refresh_delay([snapshot(NOW, NOW + 5 * DAY_SECONDS, [])], tiers, NOW) == 900
+    assert next_refresh_delay([snapshot(NOW - 500, NOW + 5 * DAY_SECONDS, [])], tiers, NOW) == 400
+    # Nothing but always-due windows: nothing is scheduled
+    assert next_refresh_delay([snapshot(NOW, NOW + DAY_SECONDS // 2, [])], tiers, NOW) is None
+    assert next_refresh_delay([None], tiers, NOW) == 0
+
+
+def stub_server(monkeypatch, handle):
+    # Route the shared session's requests to handle(path, query, headers) -> (status, headers, body)
+    session = HttpSession(retries=0)
+    requests = []
+
+    def send(url, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        requests.append((parts.path, headers))
+        status, response_headers, body = handle(parts.path, urllib.parse.parse_qs(parts.query), headers)
+        message = http.client.HTTPMessage()
+        for name, value in response_headers.items():
+            message[name] = value
+        return HttpResponse(status=status, headers=message, body=json.dumps(body).encode("utf-8"))
+
+    session._send = send
+    monkeypatch.setattr(fetch_availability, "SESSION", session)
+    return requests
+
+
+def test_cache_serves_fresh_entries_without_the_network(monkeypatch, tmp_path):
+    requests = stub_server(monkeypatch, lambda path, query, headers: (200, {}, {"n": len(requests)}))
+    cache = ResponseCache(str(tmp_path), {"home": 3600})
+    assert cache.get_json("home", "k", "http://api.test/home", params={}, headers={}) == {"n": 1}
+    assert cache.get_json("home", "k", "http://api.test/home", params={}, headers={}) == {"n": 1}
+    # A new cache on the same directory picks the entry up from disk
+    assert ResponseCache(str(tmp_path), {"home": 3600}).get_json(
+        "home", "k", "http://api.test/home", params={}, headers={}
+    ) == {"n": 1}
+    assert len(requests) == 1
+
+
+def test_cache_revalidates_stale_entries(monkeypatch, tmp_path):
+    body = {"version": 1}
+
+    def handle(path, query, headers):
+        validators = {"ETag": f'"v{body["version"]}"', "Last-Modified": "Tue, 14 Nov 2023 12:00:00 GMT"}
+        if headers.get("If-None-Match") == validators["ETag"]:
+            return 304, validators, None
+        return 200, validators, body
+
+    requests = stub_server(monkeypatch, handle)
+    cache = ResponseCache(str(tmp_path), {"home": 0})
+    assert cache.get_json("home", "k", "http://api.test/home", params={}, headers={}) == {"version": 1}
+    assert cache.get_json("home", "k", "http://api.test/home", params={}, headers={}) == {"version": 1}
+    assert requests[1][1]["If-None-Match"] == '"v1"'
+    assert requests[1][1]["If-Modified-Since"] == "Tue, 14 Nov 2023 12:00:00 GMT"
+
+    body = {"version": 2}
+    assert cache.get_json("home", "k", "http://api.test/home", params={}, headers={}) == {"version": 2}
+    assert json.loads((tmp_path / "k.json").read_text())["etag"] == '"v2"'
+
+
+@pytest.mark.parametrize("status", [401, 403])
+def test_rejected_credentials_invalidate_the_cache(monkeypatch, tmp_path, status):
+    api_keys = ["old", "new"]
+
+    def handle(path, query, headers):
+        if path.startswith("/mob/homeScreen/"):
+            return 200, {}, {"modTypeSettings": {"7": {"baseUrl": "http://gs.test", "apiKey": api_keys.pop(0)}}}
+        if headers["AuthenticationKey"] != "new":
+            return status, {}, {}
+        return 200, {}, {"types": []}
+
+    requests = stub_server(monkeypatch, handle)
+    cache = ResponseCache(str(tmp_path), {"home": 3600, "activity_list": 3600})
+    gs, activity_list = bootstrap("http://api.test", 1, "en_GB", cache)
+
+    assert gs.api_key == "new" and activity_list == {"types": []}
+    assert [path for path, _ in requests] == [
+        "/mob/homeScreen/1", "/api/activity/list", "/mob/homeScreen/1", "/api/activity/list"
+    ]
+    # The fresh credentials are what the cache holds now
+    assert bootstrap("http://api.test", 1, "en_GB", cache)[0].api_key == "new"
+    assert len(requests) == 4
+
+
+def write_config(tmp_path, config):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def test_config_jobs_get_cli_types_and_defaults(tmp_path):
+    config = write_config(tmp_path, {
+        "defaults": {"club_id": "12", "incremental": True},
+        "jobs": [
+            {"json_out": "padel.json", "keyword": "padel", "days": "7"},
+            {"json_out": "squash.json", "keyword": "squash", "club_id": 34, "delta_out": None},
+        ],
+    })
+    padel, squash = load_jobs(parse_args(["--config", config, "--locale", "de_DE"]))
+
+    assert (padel.json_out, padel.keyword, padel.days, padel.club_id) == ("padel.json", "padel", 7, 12)
+    assert (squash.json_out, squash.keyword, squash.days, squash.club_id) == ("squash.json", "squash", 14, 34)
+    assert padel.incremental and squash.incremental
+    assert padel.locale == squash.locale == "de_DE"
+    assert squash.delta_out is None
+
+
+@pytest.mark.parametrize("job, message", [
+    ({"days": "soon"}, "Invalid days 'soon' for job 2"),
+    ({"club_id": 1.5}, "Invalid club_id 1.5 for job 2"),
+    ({"incremental": "yes"}, "Invalid incremental 'yes' for job 2"),
+    ({"keyword": 12}, "Invalid keyword 12 for job 2"),
+    ({"colour": "red"}, "Unsupported job option"),
+])
+def test_malformed_config_is_reported_cleanly(tmp_path, monkeypatch, capsys, job, message):
+    config = write_config(tmp_path, {"jobs": [{"json_out": "a.json"}, {"json_out": "b.json", **job}]})
+    monkeypatch.setattr(sys, "argv", ["fetch_availability.py", "--config", config])
+    assert main() == 2
+    error = capsys.readouterr().err
+    assert error.startswith("[CONFIG ERROR] ") and message in error
+
+
+def test_config_must_list_jobs(tmp_path):
+    with pytest.raises(ValueError, match="list of jobs"):
+        load_jobs(parse_args(["--config", write_config(tmp_path, {"jobs": {"json_out": "a.json"}})]))
+    with pytest.raises(ValueError, match="job 1 .* must be an object"):
+        load_jobs(parse_args(["--config", write_config(tmp_path, {"jobs": ["a.json"]})]))
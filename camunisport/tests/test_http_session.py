@@ -0,0 +1,218 @@
+import gzip
+import http.client
+import http.server
+import json
+import threading
+import time
+import urllib.error
+import zlib
+
+import fetch_availability
+import pytest
+from fetch_availability import CircuitBreaker, HttpResponse, HttpSession
+
+BODY = json.dumps({"ok": True}).encode("utf-8")
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_GET(self):  # noqa: N802
+        Handler.requests.append((self.path, dict(self.headers)))
+        body, encoding, location = BODY, None, None
+        if self.path == "/gzip":
+            body, encoding = gzip.compress(BODY), "gzip"
+        elif self.path == "/deflate":
+            body, encoding = zlib.compress(BODY), "deflate"
+        elif self.path == "/raw-deflate":
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            body, encoding = compressor.compress(BODY) + compressor.flush(), "deflate"
+        elif self.path == "/redirect":
+            location = "/json"
+        elif self.path == "/loop":
+            location = "/loop"
+        self.send_response(302 if location else 200)
+        if location:
+            self.send_header("Location", location)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == "/drop":
+            # Close the socket without announcing it, like a server dropping an idle keep-alive connection
+            self.close_connection = True
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def base_url():
+    Handler.requests = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    session = HttpSession(timeout=5, retries=0)
+    yield session
+    session.close()
+
+
+def test_connections_are_reused(base_url, session):
+    for _ in range(3):
+        assert session.get(f"{base_url}/json", params={"q": 1}, headers={}).body == BODY
+    assert session.stats["connections_opened"] == 1
+    assert session.stats["connections_reused"] == 2
+    assert [path for path, _ in Handler.requests] == ["/json?q=1"] * 3
+
+
+@pytest.mark.parametrize("path", ["/gzip", "/deflate", "/raw-deflate"])
+def test_compressed_bodies_are_decoded(base_url, session, path):
+    resp = session.get(f"{base_url}{path}", params={}, headers={})
+    assert resp.body == BODY
+    assert Handler.requests[0][1]["Accept-Encoding"] == "gzip, deflate"
+
+
+def test_redirects_are_followed_up_to_the_limit(base_url, session):
+    assert session.get(f"{base_url}/redirect", params={}, headers={}).body == BODY
+    Handler.requests.clear()
+    with pytest.raises(urllib.error.URLError, match="Too many redirects"):
+        session.get(f"{base_url}/loop", params={}, headers={})
+    assert len(Handler.requests) == HttpSession.MAX_REDIRECTS + 1
+
+
+def test_dropped_keep_alive_connection_is_retried(base_url, session):
+    assert session.get(f"{base_url}/drop", params={}, headers={}).body == BODY
+    # The pooled connection is dead by now: the request goes out again on a fresh one
+    assert session.get(f"{base_url}/json", params={}, headers={}).body == BODY
+    assert session.stats["connections_opened"] == 2
+    assert session.stats["connections_reused"] == 1
+    assert session.stats["retries"] == 0
+    assert [path for path, _ in Handler.requests] == ["/drop", "/json"]
+
+
+def response(status, retry_after=None):
+    headers = http.client.HTTPMessage()
+    if retry_after is not None:
+        headers["Retry-After"] = retry_after
+    return HttpResponse(status=status, headers=headers, body=BODY)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(fetch_availability.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def stub_send(session, *outcomes):
+    # Replace the network with canned responses or exceptions, one per attempt
+    outcomes = list(outcomes)
+    calls = []
+
+    def send(url, headers, timeout):
+        calls.append(url)
+        outcome = outcomes.pop(0) if len(outcomes) > 1 else outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    session._send = send
+    return calls
+
+
+def test_retries_with_backoff_until_success(sleeps):
+    session = HttpSession(retries=2)
+    calls = stub_send(session, response(503), ConnectionResetError(), response(200))
+    assert session.get("http://api.test/x", params={}, headers={}).body == BODY
+    assert len(calls) == 3
+    assert session.stats["retries"] == 2
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= HttpSession.BACKOFF_BASE and 0 <= sleeps[1] <= 2 * HttpSession.BACKOFF_BASE
+
+
+def test_client_errors_are_not_retried(sleeps):
+    session = HttpSession(retries=2)
+    calls = stub_send(session, response(404))
+    with pytest.raises(urllib.error.HTTPError) as e:
+        session.get("http://api.test/x", params={}, headers={})
+    assert e.value.code == 404
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_retry_after_is_honoured_or_given_up(sleeps):
+    session = HttpSession(retries=2)
+    stub_send(session, response(429, "3"), response(200))
+    session.get("http://api.test/x", params={}, headers={})
+    assert sleeps == [3.0]
+
+    sleeps.clear()
+    calls = stub_send(session, response(429, "3600"))
+    with pytest.raises(urllib.error.HTTPError):
+        session.get("http://api.test/x", params={}, headers={})
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_budget_stops_retries_and_new_requests(sleeps):
+    session = HttpSession(retries=2)
+    session.set_budget(1)
+    calls = stub_send(session, response(503, "5"))
+    with pytest.raises(urllib.error.HTTPError):
+        session.get("http://api.test/x", params={}, headers={})
+    assert len(calls) == 1 and sleeps == []
+
+    session.deadline = time.monotonic() - 1
+    with pytest.raises(urllib.error.URLError, match="budget"):
+        session.get("http://api.test/x", params={}, headers={})
+    assert len(calls) == 1
+
+
+def test_breaker_counts_one_failure_per_request(sleeps):
+    session = HttpSession(retries=2)
+    session.breaker = CircuitBreaker(threshold=2, cooldown=60)
+    calls = stub_send(session, response(503))
+    with pytest.raises(urllib.error.HTTPError):
+        session.get("http://api.test/x", params={}, headers={})
+    # Three failed attempts are still one failed request, below the threshold
+    assert len(calls) == 3
+    with pytest.raises(urllib.error.HTTPError):
+        session.get("http://api.test/x", params={}, headers={})
+    assert len(calls) == 6
+
+    with pytest.raises(urllib.error.URLError, match="circuit open"):
+        session.get("http://api.test/x", params={}, headers={})
+    assert len(calls) == 6
+    # Other hosts are not affected
+    stub_send(session, response(200))
+    assert session.get("http://other.test/x", params={}, headers={}).body == BODY
+
+
+def test_breaker_lets_a_single_probe_through_after_cooldown():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.1)
+    breaker.record("api.test", ok=False)
+    with pytest.raises(urllib.error.URLError):
+        breaker.check("api.test")
+    time.sleep(0.15)
+    breaker.check("api.test")
+    # The probe is in flight: everyone else is still short-circuited
+    with pytest.raises(urllib.error.URLError):
+        breaker.check("api.test")
+
+    # A failed probe opens the breaker for another cooldown
+    breaker.record("api.test", ok=False)
+    time.sleep(0.05)
+    with pytest.raises(urllib.error.URLError):
+        breaker.check("api.test")
+    time.sleep(0.1)
+    breaker.check("api.test")
+    breaker.record("api.test", ok=True)
+    breaker.check("api.test")
+    breaker.check("api.test")
@@ -52,15 +52,70 @@
 #   python extract-emotions.py emotions_test.mov emotions.csv --interval 2.5  # extract every 2.5 seconds
 #   python extract-emotions.py emotions_test.mov emotions.csv --epochs 00:00:00-00:00:30  # first 30 seconds only
 #   python extract-emotions.py emotions_test.mov emotions.csv --epochs 01:15:00-01:30:00 01:45:00-01:50:00  # epoch1 (1hr15 - 1hr30), and also epoch2 (1hr45 - 1hr50)
+#   python extract-emotions.py emotions_test.mov emotions.csv --workers 4  # analyse 4 time chunks at a time, in parallel
+#   python extract-emotions.py emotions_test.mov emotions.csv --actions emotion  # emotions only, skips the age/gender/race models
+#   python extract-emotions.py emotions_test.mov emotions.csv --resume  # continue an interrupted run where it stopped
+#   python extract-emotions.py emotions_test.mov emotions.csv --track 10  # detect the face every 10th frame, track it in between
+#   python extract-emotions.py emotions_test.mov emotions.csv --cache ~/.cache/extract-emotions  # reuse results of earlier runs
+#   python extract-emotions.py emotions_test.mov emotions.csv --interval 2 --adaptive  # every 2 seconds, and more often where emotions change
+#   python extract-emotions.py emotions_test.mov emotions.csv --max-side 640  # analyse frames downsized to 640 pixels at most
 #   ```
 #
+# Rows are written to the output CSV as frames are analysed, so a crash or Ctrl-C keeps everything analysed so
+# far, and --resume carries on after the last frame in the output (run it with the same options).
+#
+# The face detector and attribute models are loaded once (per worker) and warmed up, and the attribute models
+# run on batches of faces (--batch-size frames at a time) instead of one `DeepFace.analyze` call per frame.
+#
+# With --track N, the face found by the detector is followed on the next sampled frames by matching it around
+# its last position, which is much cheaper than detecting it again. The detector runs again every N frames, when
+# the match gets poor, or after a gap in the samples (e.g. between epochs). Tracked faces aren't aligned like
+# detected ones, so their attributes can differ slightly. The share of frames where detection was skipped is
+# logged at the end.
+#
+# With --cache DIR, the face results of every analysed frame are kept in DIR (an SQLite file per video, named
+# after a hash of the video's content), so later runs on the same video with other --epochs or --interval only
+# analyse the frames not seen before. Results are only reused for the same --actions, --track and --max-side. With
+# --cache-near-duplicates, a frame that looks the same as a cached frame just before it (by perceptual hash) gets
+# that frame's results too.
+#
+# With --adaptive, frames every --interval are analysed first, then between each two consecutive ones whose
+# emotions differ (dominant emotion, or any probability by more than --change-threshold points) the frame halfway
+# is analysed as well, and so on between it and both ends, down to --min-interval. --max-inferences caps the
+# total number of frames analysed; what's left of it is shared evenly between the gaps still to refine.
+#
+# Frames are decoded (and downsized with --max-side) by a background thread, ahead of the analysis, and in debug
+# mode frames are saved by a pool of threads, so decoding and writing JPEGs overlap with the models running.
+#
+# With --workers, each worker process opens the video and loads the models itself (about 1GB of memory
+# each), so pick a number that fits in memory as well as in CPU cores.
+#
 # Note the first time you run it, it will download model weights (~1GB) which may take some time.
 #
+import hashlib
+import json
 import logging
+import math
 import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
 import cv2
 import csv
+import numpy as np
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from deepface import DeepFace
+from deepface.modules import preprocessing
+try:
+    from deepface.models.demography.DemographyUtils import EMOTION_LABELS, GENDER_LABELS, RACE_LABELS
+except ImportError:
+    # Older deepface releases keep the labels next to each model
+    from deepface.models.demography.Emotion import labels as EMOTION_LABELS
+    from deepface.models.demography.Gender import labels as GENDER_LABELS
+    from deepface.models.demography.Race import labels as RACE_LABELS
 import argparse
 from datetime import datetime
 
@@ -102,13 +157,138 @@ parser.add_argument(
         "drawn over them as jpg in a newly created `frames_<command_run_timestamp>` directory."
     )
 )
+parser.add_argument(
+    '--actions',
+    nargs='+',
+    choices=['emotion', 'age', 'gender', 'race'],
+    default=['emotion', 'age', 'gender', 'race'],
+    help="Attributes to analyse. Default is all of them; models of the others aren't loaded or run."
+)
+parser.add_argument(
+    '--batch-size',
+    type=int,
+    default=8,
+    help="Number of sampled frames whose faces go through the attribute models together. Default is 8."
+)
+parser.add_argument(
+    '--resume',
+    action='store_true',
+    help=(
+        "If the output CSV exists (e.g. from an interrupted run with the same options), keep its rows and "
+        "continue after its last frame instead of starting over."
+    )
+)
+parser.add_argument(
+    '--track',
+    type=int,
+    metavar='N',
+    help=(
+        "Track the face between detections and run the face detector only every N sampled frames (or when "
+        "tracking is lost). Suits a subject sitting in front of a fixed camera. Default is to detect on every frame."
+    )
+)
+parser.add_argument(
+    '--cache',
+    metavar='DIR',
+    help=(
+        "Directory where per-frame results are cached across runs, so frames already analysed (with the same "
+        "--actions and --track) aren't analysed again. Default is no cache."
+    )
+)
+parser.add_argument(
+    '--cache-near-duplicates',
+    action='store_true',
+    help=(
+        "With --cache, also reuse the results of a cached frame up to 1 s before when the frame looks the same "
+        "(perceptual hash). Fast, but the results then aren't exactly those of the frame itself."
+    )
+)
+parser.add_argument(
+    '--adaptive',
+    action='store_true',
+    help=(
+        "Sample every --interval first, then also analyse the frames halfway between consecutive samples whose "
+        "emotions differ (see --change-threshold), and so on down to --min-interval. Adds a sampling_level column "
+        "(0 for the --interval samples, 1 for the first halfway frames, ...)."
+    )
+)
+parser.add_argument(
+    '--min-interval',
+    type=float,
+    default=0.1,
+    help="With --adaptive, the smallest interval in seconds between analysed frames. Default is 0.1 s."
+)
+parser.add_argument(
+    '--change-threshold',
+    type=float,
+    default=10,
+    help=(
+        "With --adaptive, refine between two frames when the dominant emotion changes, or an emotion's "
+        "probability changes by more than this many percentage points. Default is 10."
+    )
+)
+parser.add_argument(
+    '--max-inferences',
+    type=int,
+    help="With --adaptive, the most frames to analyse in total (including the --interval samples). Default is no limit."
+)
+parser.add_argument(
+    '--max-side',
+    type=int,
+    help=(
+        "Downsize frames so that neither their width nor their height is above this many pixels before analysing "
+        "them (face regions are still reported in pixels of the original frames). Default is full resolution."
+    )
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=1,
+    help=(
+        "Number of worker processes. The frames to analyse are split into time chunks, analysed in "
+        "parallel, and written in timestamp order. Default is 1 (no parallelism)."
+    )
+)
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(levelname)s - %(message)s'
 
-args = parser.parse_args()
+ACTIONS = ['emotion', 'age', 'gender', 'race']
+ATTRIBUTE_MODELS = {'emotion': 'Emotion', 'age': 'Age', 'gender': 'Gender', 'race': 'Race'}
+# Same as DeepFace.analyze's defaults
+DETECTOR_BACKEND = 'opencv'
+ATTRIBUTE_INPUT_SIZE = (224, 224)
 
-# Set logging level based on debug flag
-log_level = logging.DEBUG if args.debug else logging.INFO
-logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
-logging.info(f"Importing modules")
+# Gaps between sampled frames shorter than this are skipped with cap.grab(), longer ones with a seek. A seek
+# lands on the previous keyframe and decodes from there, so it only pays off over gaps longer than a GOP.
+SEEK_MIN_GAP_S = 1.0
+
+# With --workers, split the frames into about this many chunks per worker (to even out chunks where faces
+# are harder to analyse) but not into chunks of fewer frames than MIN_CHUNK_FRAMES
+CHUNKS_PER_WORKER = 4
+MIN_CHUNK_FRAMES = 10
+PROGRESS_INTERVAL_S = 10
+
+# With --track, the last detected face is looked for (in grayscale) within TRACK_SEARCH_MARGIN of its size around
+# its last position. A match scoring below TRACK_MIN_SCORE (normalised correlation), or more than TRACK_MAX_GAP_S
+# since the last sampled frame, runs the detector again.
+TRACK_SEARCH_MARGIN = 0.25
+TRACK_MIN_SCORE = 0.6
+TRACK_MAX_GAP_S = 2.0
+
+# The video hash of the --cache covers the file size and VIDEO_HASH_BLOCKS blocks spread over the file, so
+# hour-long recordings don't have to be read in full. Frames whose perceptual (difference) hashes differ by at
+# most NEAR_DUPLICATE_MAX_BITS of 64 bits, and are at most NEAR_DUPLICATE_MAX_GAP_S apart, are near-duplicates.
+VIDEO_HASH_BLOCKS = 64
+VIDEO_HASH_BLOCK_SIZE = 1 << 16
+NEAR_DUPLICATE_MAX_BITS = 4
+NEAR_DUPLICATE_MAX_GAP_S = 1.0
+
+# Frames are decoded (and downsized to --max-side) by a thread of their own, up to PREFETCH_BATCHES batches ahead
+# of the analysis. In debug mode, frames are saved by DEBUG_WRITER_THREADS threads, with at most
+# DEBUG_WRITE_BACKLOG frames waiting.
+PREFETCH_BATCHES = 2
+DEBUG_WRITER_THREADS = 2
+DEBUG_WRITE_BACKLOG = 16
 
 def parse_time(time_str):
     h, m, s = map(int, time_str.split(':'))
@@ -121,7 +301,783 @@ def seconds_to_hms(seconds):
     ms = int((seconds - int(seconds)) * 1000)
     return f"{h:02}:{m:02}:{s:02}.{ms:03}"
 
-def extract_emotions(video_path, output_csv, epochs=None, interval_s=0.1, save_frames=False):
+def sample_frame_numbers(epochs_sec, fps, frame_interval, frame_count):
+    """Yield (epoch index, frame number) for every frame to analyse, in order.
+
+    These are the frames whose number is a multiple of frame_interval and whose timestamp is within an epoch,
+    i.e. the ones reading the whole video frame by frame would keep.
+    """
+    next_frame = 0
+    for epoch_idx, (start_time, end_time) in enumerate(epochs_sec):
+        frame_number = max(next_frame, math.ceil(start_time * fps))
+        frame_number += -frame_number % frame_interval
+        while frame_number / fps < start_time:
+            frame_number += frame_interval
+        while frame_number < frame_count and frame_number / fps <= end_time:
+            yield epoch_idx, frame_number
+            frame_number += frame_interval
+        next_frame = max(next_frame, frame_number)
+
+def read_sampled_frames(cap, samples, fps):
+    """Yield (epoch index, frame number, frame) for each sample, without decoding the frames in between.
+
+    Samples are expected in frame order, going back (with a seek) only costs more.
+    """
+    seek_min_gap = max(1, int(SEEK_MIN_GAP_S * fps))
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))  # number of the frame the next read returns
+    for epoch_idx, frame_number in samples:
+        if frame_number < position or frame_number - position >= seek_min_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if position > frame_number:
+                # Some backends only seek to keyframes: go back to one before the target and grab forward
+                cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, frame_number - seek_min_gap))
+                position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            logging.debug(f"Seeked to frame {position} for frame {frame_number}")
+        # grab() skips the colour conversion and copy of the frames we don't keep
+        while position < frame_number:
+            if not cap.grab():
+                return
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield epoch_idx, frame_number, frame
+
+# A frame to analyse: `frame` is downsized by `scale` (1 if it wasn't), `original` is the full-size frame when
+# it's needed afterwards (to save it in debug mode), else None
+SampledFrame = namedtuple('SampledFrame', ['epoch_idx', 'frame_number', 'frame', 'scale', 'original'])
+
+def downsize_frames(frames, max_side=None, keep_original=False):
+    """SampledFrame of each (epoch index, frame number, frame), downsized to fit in max_side x max_side."""
+    for epoch_idx, frame_number, frame in frames:
+        original = frame if keep_original else None
+        height, width = frame.shape[:2]
+        if max_side and max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            frame = cv2.resize(
+                frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA,
+            )
+        else:
+            scale = 1
+        yield SampledFrame(epoch_idx, frame_number, frame, scale, original)
+
+def prefetch(iterable, size):
+    """Iterate over `iterable` in a background thread, which keeps up to `size` items ready.
+
+    The thread stops (and is waited for) when the returned generator is closed.
+    """
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except Exception as error:
+            put((end, error))
+
+    thread = threading.Thread(target=produce, name='decoder', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def scale_result(result, factor):
+    """Face result with its region's coordinates (and eyes) multiplied by `factor`."""
+    region = {
+        key: tuple(round(coordinate * factor) for coordinate in value) if isinstance(value, (tuple, list))
+        else round(value * factor) if key in ('x', 'y', 'w', 'h')
+        else value
+        for key, value in result['region'].items()
+    }
+    return {**result, 'region': region}
+
+def build_attribute_model(name):
+    try:
+        return DeepFace.build_model(model_name=name, task='facial_attribute')
+    except TypeError:
+        # deepface < 0.0.93 only has attribute models
+        return DeepFace.build_model(name)
+
+class FaceTracker:
+    """Follows a single detected face over the next sampled frames by template matching around its last region.
+
+    `counts` has the number of frames where the face was 'detected', 'tracked' instead, and where tracking was
+    'lost' (so the detector ran after all).
+    """
+
+    def __init__(self, redetect_every, max_gap_frames):
+        self.redetect_every = redetect_every
+        self.max_gap_frames = max_gap_frames
+        self.template = None  # grayscale crop of the last detected face, None when there's nothing to track
+        self.region = None
+        self.confidence = None
+        self.frame_number = None
+        self.since_detection = 0
+        self.counts = {'detected': 0, 'tracked': 0, 'lost': 0}
+
+    def track(self, frame, frame_number):
+        """The face in `frame` like DeepFace.extract_faces gives it, or None if the detector has to run."""
+        if (
+            self.template is None
+            or self.since_detection + 1 >= self.redetect_every
+            or abs(frame_number - self.frame_number) > self.max_gap_frames
+        ):
+            return None
+        x, y, w, h = self.region
+        margin = int(TRACK_SEARCH_MARGIN * max(w, h))
+        left, top = max(0, x - margin), max(0, y - margin)
+        window = cv2.cvtColor(frame[top:y + h + margin, left:x + w + margin], cv2.COLOR_BGR2GRAY)
+        if window.shape[0] < h or window.shape[1] < w:
+            self.counts['lost'] += 1
+            return None
+        _, score, _, (dx, dy) = cv2.minMaxLoc(cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED))
+        if score < TRACK_MIN_SCORE:
+            self.counts['lost'] += 1
+            return None
+
+        x, y = left + dx, top + dy
+        self.region = (x, y, w, h)
+        self.frame_number = frame_number
+        self.since_detection += 1
+        self.counts['tracked'] += 1
+        return {
+            # RGB in [0, 1] like extract_faces' crops
+            'face': frame[y:y + h, x:x + w, ::-1] / 255,
+            'facial_area': {'x': x, 'y': y, 'w': w, 'h': h, 'left_eye': None, 'right_eye': None},
+            'confidence': self.confidence,
+        }
+
+    def update(self, frame, frame_number, faces):
+        """Start tracking from what the detector found in `frame`, if it's a single face."""
+        self.counts['detected'] += 1
+        self.template = None
+        if len(faces) != 1:
+            return
+        area = faces[0]['facial_area']
+        x, y, w, h = max(0, area['x']), max(0, area['y']), area['w'], area['h']
+        template = cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+        if template.shape != (h, w) or min(h, w) < 2:
+            return
+        self.template = template
+        self.region = (x, y, w, h)
+        self.confidence = faces[0]['confidence']
+        self.frame_number = frame_number
+        self.since_detection = 0
+
+class FacePipeline:
+    """DeepFace's face detector and attribute models, loaded once and run on batches of faces.
+
+    Uses the same models, preprocessing and output format as DeepFace.analyze(frame, actions,
+    enforce_detection=False), but each attribute model runs once per batch of faces rather than once per
+    face, and only on the faces of frames with a single face (the others are skipped anyway).
+    """
+
+    def __init__(self, actions=ACTIONS):
+        self.actions = [action for action in ACTIONS if action in actions]
+        logging.info(f"Loading models for {', '.join(self.actions)}")
+        self.models = {action: build_attribute_model(ATTRIBUTE_MODELS[action]) for action in self.actions}
+        self.warm_up()
+
+    def warm_up(self):
+        # Loads the detector and builds the models' graphs now, rather than on the first real frame. Models
+        # run single images and batches differently, so warm up both.
+        self.detect(np.zeros((*ATTRIBUTE_INPUT_SIZE, 3), dtype=np.uint8))
+        blank_face = np.zeros((*ATTRIBUTE_INPUT_SIZE, 3), dtype=np.float32)
+        for model in self.models.values():
+            model.predict(blank_face)
+            model.predict([blank_face, blank_face])
+
+    def detect(self, frame):
+        faces = DeepFace.extract_faces(
+            frame, detector_backend=DETECTOR_BACKEND, enforce_detection=False, align=True,
+        )
+        # Remove those with confidence == 0 (dunno why these show up in the first place), and empty crops
+        # like DeepFace.analyze does
+        return [face for face in faces if face['confidence'] > 0 and min(face['face'].shape[:2]) > 0]
+
+    def find_faces(self, frame, frame_number=None, tracker=None):
+        if tracker is not None:
+            face = tracker.track(frame, frame_number)
+            if face is not None:
+                return [face]
+        faces = self.detect(frame)
+        if tracker is not None:
+            tracker.update(frame, frame_number, faces)
+        return faces
+
+    def analyze_batch(self, frames, frame_numbers=None, tracker=None):
+        """Return, for each frame, a list of DeepFace.analyze-like results, one per detected face.
+
+        Results of frames with several faces only have 'region' and 'face_confidence'. With a FaceTracker (and
+        the frames' numbers), faces are tracked from one frame to the next instead of detected when possible.
+        """
+        frame_numbers = frame_numbers or [None] * len(frames)
+        frames_faces = [
+            self.find_faces(frame, frame_number, tracker) for frame, frame_number in zip(frames, frame_numbers)
+        ]
+        single_faces = [faces[0] for faces in frames_faces if len(faces) == 1]
+        predictions = self.predict([face['face'] for face in single_faces]) if single_faces else {}
+
+        batch_results = []
+        single_idx = 0
+        for faces in frames_faces:
+            results = [{'region': face['facial_area'], 'face_confidence': face['confidence']} for face in faces]
+            if len(faces) == 1:
+                results[0].update(self.attributes(predictions, single_idx))
+                single_idx += 1
+            batch_results.append(results)
+        return batch_results
+
+    def predict(self, faces):
+        # Preprocess like DeepFace.analyze: RGB to BGR and padded resize to 224x224 (the emotion model makes
+        # its 48x48 grayscale input from that itself)
+        images = [
+            preprocessing.resize_image(img=face[:, :, ::-1], target_size=ATTRIBUTE_INPUT_SIZE)[0] for face in faces
+        ]
+        predictions = {}
+        for action, model in self.models.items():
+            # The attribute models take a list of images and predict them as one batch. A batch of one gives
+            # an unbatched result, hence the atleast_*d.
+            output = model.predict(images)
+            predictions[action] = np.atleast_1d(output) if action == 'age' else np.atleast_2d(output)
+        return predictions
+
+    def attributes(self, predictions, idx):
+        result = {}
+        if 'emotion' in predictions:
+            emotion = predictions['emotion'][idx]
+            result['emotion'] = {label: 100 * emotion[i] / emotion.sum() for i, label in enumerate(EMOTION_LABELS)}
+            result['dominant_emotion'] = EMOTION_LABELS[int(np.argmax(emotion))]
+        if 'age' in predictions:
+            # The age model gives the apparent age (expected value over its age classes)
+            result['age'] = int(predictions['age'][idx])
+        if 'gender' in predictions:
+            gender = predictions['gender'][idx]
+            result['gender'] = {label: 100 * gender[i] for i, label in enumerate(GENDER_LABELS)}
+            result['dominant_gender'] = GENDER_LABELS[int(np.argmax(gender))]
+        if 'race' in predictions:
+            race = predictions['race'][idx]
+            result['race'] = {label: 100 * race[i] / race.sum() for i, label in enumerate(RACE_LABELS)}
+            result['dominant_race'] = RACE_LABELS[int(np.argmax(race))]
+        return result
+
+def video_hash(video_path):
+    """Hash of the video's size and of blocks spread evenly over its content (including its start and end)."""
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(video_path, 'rb') as file:
+        step = max(VIDEO_HASH_BLOCK_SIZE, (size - VIDEO_HASH_BLOCK_SIZE) // (VIDEO_HASH_BLOCKS - 1))
+        for offset in range(0, max(1, size - VIDEO_HASH_BLOCK_SIZE + 1), step):
+            file.seek(offset)
+            digest.update(file.read(VIDEO_HASH_BLOCK_SIZE))
+        file.seek(max(0, size - VIDEO_HASH_BLOCK_SIZE))
+        digest.update(file.read(VIDEO_HASH_BLOCK_SIZE))
+    return digest.hexdigest()
+
+def perceptual_hash(frame):
+    """64-bit difference hash: whether each pixel of a 9x8 grayscale thumbnail is brighter than the next one."""
+    thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    # As a signed 64-bit int, the SQLite integer type
+    return int(np.packbits(bits).view('>i8')[0])
+
+def _json_default(value):
+    # Numpy scalars from the models. str() gives float32s the digits they'd have in the CSV if written directly.
+    if isinstance(value, np.floating):
+        return float(str(value))
+    return value.item()
+
+class ResultCache:
+    """Face results of analysed frames (as returned by FacePipeline.analyze_batch), kept in an SQLite file.
+
+    Entries are keyed by frame number and `config` (whatever else changes the results). Can be sent to worker
+    processes, which open their own connection.
+
+    `counts` has the number of frames found in the cache ('cached') and served from a near-duplicate frame
+    ('near duplicate').
+    """
+
+    def __init__(self, path, config, near_duplicate_frames=None):
+        self.path = path
+        self.config = config
+        self.near_duplicate_frames = near_duplicate_frames
+        self.connection = None
+        self.counts = {'cached': 0, 'near duplicate': 0}
+
+    def __getstate__(self):
+        return {**self.__dict__, 'connection': None}
+
+    def connect(self):
+        if self.connection is None:
+            # Workers write to the same file: wait for each other's transactions rather than fail
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'config TEXT, frame INTEGER, phash INTEGER, faces TEXT, PRIMARY KEY (config, frame))'
+            )
+        return self.connection
+
+    def get(self, frame_number, frame):
+        """Cached results of the frame, or None."""
+        connection = self.connect()
+        row = connection.execute(
+            'SELECT faces FROM results WHERE config = ? AND frame = ?', (self.config, frame_number)
+        ).fetchone()
+        if row is not None:
+            self.counts['cached'] += 1
+            return json.loads(row[0])
+        if self.near_duplicate_frames:
+            row = connection.execute(
+                'SELECT phash, faces FROM results WHERE config = ? AND frame < ? AND frame >= ? '
+                'ORDER BY frame DESC LIMIT 1',
+                (self.config, frame_number, frame_number - self.near_duplicate_frames),
+            ).fetchone()
+            if row is not None:
+                different_bits = bin((row[0] ^ perceptual_hash(frame)) & (2 ** 64 - 1)).count('1')
+                if different_bits <= NEAR_DUPLICATE_MAX_BITS:
+                    self.counts['near duplicate'] += 1
+                    return json.loads(row[1])
+        return None
+
+    def put_many(self, entries):
+        """Cache the results of (frame number, frame, results) entries."""
+        connection = self.connect()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                [
+                    (self.config, frame_number, perceptual_hash(frame), json.dumps(results, default=_json_default))
+                    for frame_number, frame, results in entries
+                ],
+            )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def open_result_cache(cache_dir, video_path, actions, track_every, max_side, fps, near_duplicates=False):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{video_hash(video_path)}.sqlite")
+    config = json.dumps({
+        'actions': [action for action in ACTIONS if action in actions],
+        'detector': DETECTOR_BACKEND,
+        'track': track_every or None,
+        'max_side': max_side or None,
+    })
+    logging.info(f"Caching results in {path}")
+    return ResultCache(path, config, max(1, int(NEAR_DUPLICATE_MAX_GAP_S * fps)) if near_duplicates else None)
+
+# Settings of --adaptive: gaps between analysed frames aren't halved below min_gap_frames, only when emotions
+# differ by more than `threshold` percentage points (or the dominant one changes), and for at most max_inferences
+# frames in total (None: no limit)
+AdaptiveSampling = namedtuple('AdaptiveSampling', ['min_gap_frames', 'threshold', 'max_inferences'])
+
+_pipeline = None
+
+def get_pipeline(actions):
+    """This process's FacePipeline, so a worker loads the models once for all its chunks."""
+    global _pipeline
+    if _pipeline is None or _pipeline.actions != [action for action in ACTIONS if action in actions]:
+        _pipeline = FacePipeline(actions)
+    return _pipeline
+
+def save_debug_frame(frame, face_results, frame_filename, log_prefix):
+    # Draw rectangle around detected face and save the frame
+    for result in face_results:
+        region = result['region']
+        x, y, w, h = region['x'], region['y'], region['w'], region['h']
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    cv2.imwrite(frame_filename, frame)
+    logging.info(f"{log_prefix} Saved frame to {frame_filename}")
+
+class DebugFrameWriter:
+    """Saves frames with their faces drawn over them (in debug mode) from a pool of threads, so that JPEG
+    encoding and writing don't hold up the analysis. At most DEBUG_WRITE_BACKLOG frames wait to be written.
+    """
+
+    def __init__(self, frames_dir):
+        self.frames_dir = frames_dir
+        self.executor = ThreadPoolExecutor(max_workers=DEBUG_WRITER_THREADS, thread_name_prefix='debug-writer')
+        self.backlog = threading.BoundedSemaphore(DEBUG_WRITE_BACKLOG)
+
+    def submit(self, frame, face_results, frame_number, timestamp):
+        self.backlog.acquire()
+        future = self.executor.submit(
+            save_debug_frame, frame, face_results, f"{self.frames_dir}/frame_{frame_number:06d}.jpg",
+            f"[timestamp {timestamp:.2f}s]",
+        )
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self.backlog.release()
+        if future.exception() is not None:
+            logging.error(f"Failed to save a debug frame: {future.exception()!r}")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+def frame_row(face_results, frame_number, timestamp, epoch_label):
+    """CSV row of an analysed frame, or None unless exactly one face was found."""
+    log_prefix = f"[timestamp {timestamp:.2f}s]"
+
+    logging.debug(f"{log_prefix} face_results ({len(face_results)}): {face_results}")
+
+    if len(face_results) != 1:
+        logging.warn(f"{log_prefix} Skipping because found {len(face_results)} faces")
+        return None
+    result = face_results[0]
+
+    try:
+        row = {
+            "epoch": epoch_label,
+            "frame": frame_number,
+            "timestamp": seconds_to_hms(timestamp),
+            "timestamp_seconds": timestamp,
+        }
+        # Same column order as before --actions, minus the attributes that weren't analysed
+        for action in ('gender', 'race', 'age', 'emotion'):
+            if action in result:
+                row[action] = result['age'] if action == 'age' else result[f'dominant_{action}']
+        for action in ('gender', 'race', 'emotion'):
+            if action in result:
+                row.update({f"{action}:{k}": v for k, v in result[action].items()})
+    except:
+        raise ValueError(f"{log_prefix} Unexpected result format at {timestamp:.2f}s: {result}")
+    detected = ' '.join(str(row[action]) for action in ('gender', 'race', 'age', 'emotion') if action in row)
+    logging.info(f"{log_prefix} Detected: {detected}")
+    return row
+
+def csv_fieldnames(actions, adaptive=False):
+    """Columns of the output CSV, known before any frame is analysed."""
+    fieldnames = ["epoch", "frame", "timestamp", "timestamp_seconds"]
+    fieldnames += [action for action in ('gender', 'race', 'age', 'emotion') if action in actions]
+    for action, labels in (('gender', GENDER_LABELS), ('race', RACE_LABELS), ('emotion', EMOTION_LABELS)):
+        if action in actions:
+            fieldnames += [f"{action}:{label}" for label in labels]
+    if adaptive:
+        fieldnames.append("sampling_level")
+    return fieldnames
+
+def read_resume_point(output_csv, fieldnames):
+    """Frame number of the last row of an existing output (-1 if it has no rows), or None if there's no output.
+
+    A last line cut short by a crash is removed from the file.
+    """
+    try:
+        with open(output_csv, 'rb+') as file:
+            content = file.read()
+            end = content.rfind(b'\n') + 1
+            if end < len(content):
+                logging.warning(f"Removing incomplete last line of {output_csv}")
+                file.truncate(end)
+    except FileNotFoundError:
+        return None
+    lines = content[:end].decode('utf-8').splitlines()
+    if not lines:
+        return None
+    reader = csv.DictReader(lines)
+    if reader.fieldnames != fieldnames:
+        raise ValueError(
+            f"Can't resume: the columns of {output_csv} don't match, was it written with other --actions or --adaptive?"
+        )
+    last_frame = -1
+    for row in reader:
+        last_frame = int(row['frame'])
+    return last_frame
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def emotions_differ(results_a, results_b, threshold):
+    """Whether the face results of two frames differ enough to analyse the frames in between (--adaptive)."""
+    if len(results_a) != 1 or len(results_b) != 1:
+        # Refine around a face appearing or disappearing, not between two frames that are skipped anyway
+        return (len(results_a) == 1) != (len(results_b) == 1)
+    a, b = results_a[0], results_b[0]
+    return (
+        a['dominant_emotion'] != b['dominant_emotion']
+        or max(abs(a['emotion'][label] - b['emotion'][label]) for label in a['emotion']) > threshold
+    )
+
+def iter_sample_rows(video_path, samples, epochs, fps, actions=ACTIONS, batch_size=8, frames_dir=None,
+                     progress=None, chunk_idx=None, track_every=None, cache=None, adaptive=None, max_side=None,
+                     counts=None):
+    """Analyse the given (epoch index, frame number) samples with a capture of our own, yielding the rows.
+
+    Frames are decoded ahead by a background thread and, with `max_side`, downsized before they're analysed
+    (face regions are still given in pixels of the original frames). If `progress` is a queue, (chunk_idx,
+    number of samples done) is put on it after each batch. With `track_every`, faces are tracked between
+    detections. With a ResultCache, frames in it aren't analysed and the others are added to it. With
+    AdaptiveSampling, frames between consecutive samples whose emotions differ are analysed too, and rows get
+    their 'sampling_level'. The FaceTracker and ResultCache counts, and the number of 'refined' frames, are added
+    to the `counts` Counter when done.
+    """
+    pipeline = get_pipeline(actions)
+    tracker = FaceTracker(track_every, max(1, int(TRACK_MAX_GAP_S * fps))) if track_every else None
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Error: Could not open video.")
+    # Frames between samples are read with a capture of their own, so `cap` keeps going forward
+    refine_cap = cv2.VideoCapture(video_path) if adaptive else None
+    frames = prefetch(
+        downsize_frames(read_sampled_frames(cap, samples, fps), max_side, bool(frames_dir)),
+        PREFETCH_BATCHES * batch_size,
+    )
+    debug_writer = DebugFrameWriter(frames_dir) if frames_dir else None
+    done = 0
+    refined = 0
+
+    def analyze(batch):
+        """Face results of each SampledFrame, from the cache or the models, with regions in original pixels."""
+        batch_results = [cache.get(sample.frame_number, sample.frame) if cache else None for sample in batch]
+        new = [idx for idx, results in enumerate(batch_results) if results is None]
+        if new:
+            new_results = pipeline.analyze_batch(
+                [batch[idx].frame for idx in new], [batch[idx].frame_number for idx in new], tracker,
+            )
+            for idx, results in zip(new, new_results):
+                scale = batch[idx].scale
+                batch_results[idx] = results if scale == 1 else [scale_result(result, 1 / scale) for result in results]
+            if cache:
+                cache.put_many([(batch[idx].frame_number, batch[idx].frame, batch_results[idx]) for idx in new])
+        # Full-size frames are only kept afterwards to save in debug mode
+        return [
+            (sample.epoch_idx, sample.frame_number, sample.original, results)
+            for sample, results in zip(batch, batch_results)
+        ]
+
+    def rows(analysed, level=0):
+        for epoch_idx, frame_number, original, face_results in analysed:
+            if debug_writer:
+                debug_writer.submit(original, face_results, frame_number, frame_number / fps)
+            epoch_label = f"epoch{epoch_idx + 1} ({epochs[epoch_idx]})"
+            row = frame_row(face_results, frame_number, frame_number / fps, epoch_label)
+            if row is not None:
+                if adaptive:
+                    row['sampling_level'] = level
+                yield row
+
+    def report(count):
+        nonlocal done
+        done += count
+        if progress is not None:
+            progress.put((chunk_idx, done))
+
+    def refine(first, last, allowance):
+        """Analyse frames between two analysed samples, halving the gaps where emotions differ, level by level.
+
+        Returns the (level, analysed frame) of up to `allowance` (None: any number of) frames, in frame order.
+        """
+        nonlocal refined
+        pairs = [(first, last)]
+        found = []
+        level = 1
+        while pairs and (allowance is None or allowance > 0):
+            split = [
+                (a, b) for a, b in pairs
+                if (b[1] - a[1]) // 2 >= adaptive.min_gap_frames and emotions_differ(a[3], b[3], adaptive.threshold)
+            ][:allowance]
+            middles = [(a[0], (a[1] + b[1]) // 2) for a, b in split]
+            analysed = []
+            middle_frames = downsize_frames(read_sampled_frames(refine_cap, middles, fps), max_side, bool(frames_dir))
+            for batch in batched(middle_frames, batch_size):
+                analysed += analyze(batch)
+            if allowance is not None:
+                allowance -= len(analysed)
+            refined += len(analysed)
+            found += [(level, middle) for middle in analysed]
+            pairs = [pair for (a, b), middle in zip(split, analysed) for pair in ((a, middle), (middle, b))]
+            level += 1
+        return sorted(found, key=lambda item: item[1][1])
+
+    try:
+        if not adaptive:
+            for batch in batched(frames, batch_size):
+                yield from rows(analyze(batch))
+                report(len(batch))
+            return
+
+        # Each sample's row waits for the frames refined between it and the next sample, to keep frame order.
+        # Each pair of samples can refine its share of what's left of the budget, so unused shares carry over.
+        budget = None if adaptive.max_inferences is None else max(0, adaptive.max_inferences - len(samples))
+        pairs_left = len(samples) - 1
+        previous = None
+        for batch in batched(frames, batch_size):
+            for sample in analyze(batch):
+                if previous is not None:
+                    yield from rows([previous])
+                    if previous[0] == sample[0]:
+                        allowance = None if budget is None else math.ceil(budget / max(1, pairs_left))
+                        found = refine(previous, sample, allowance)
+                        if budget is not None:
+                            budget -= len(found)
+                        for level, analysed in found:
+                            yield from rows([analysed], level)
+                    pairs_left -= 1
+                previous = sample
+            report(len(batch))
+        if previous is not None:
+            yield from rows([previous])
+    finally:
+        # Stops the decoder thread before its capture is released
+        frames.close()
+        cap.release()
+        if debug_writer is not None:
+            debug_writer.close()
+        if refine_cap is not None:
+            refine_cap.release()
+        if counts is not None:
+            counts['refined'] += refined
+            if tracker is not None:
+                counts.update(tracker.counts)
+            if cache is not None:
+                counts.update(cache.counts)
+        if cache is not None:
+            cache.close()
+
+def process_samples(*args, **kwargs):
+    """Like iter_sample_rows, but returns the list of rows and the counts (to send back from a worker process)."""
+    counts = Counter()
+    rows = list(iter_sample_rows(*args, **kwargs, counts=counts))
+    return rows, counts
+
+def split_chunks(samples, workers):
+    """Split the samples into runs of consecutive samples, i.e. time chunks of about equal length."""
+    chunk_count = max(1, min(workers * CHUNKS_PER_WORKER, len(samples) // MIN_CHUNK_FRAMES))
+    chunk_size = math.ceil(len(samples) / chunk_count)
+    return [samples[i:i + chunk_size] for i in range(0, len(samples), chunk_size)]
+
+def _init_worker(log_level):
+    # Spawned workers (the default on macOS) don't inherit the logging configuration
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+
+def process_parallel(video_path, samples, epochs, fps, actions, batch_size, frames_dir, workers, write_rows,
+                     track_every=None, cache=None, adaptive=None, max_side=None, counts=None):
+    """Analyse the samples in time chunks across worker processes, passing the rows to write_rows in timestamp
+    order: each chunk's rows as soon as it and all the chunks before it are done. Returns the number of rows.
+
+    Tracking (with `track_every`) starts over in each chunk, each worker opens its own connection to the `cache`,
+    adaptive sampling doesn't refine across chunks and splits max_inferences between them by size, and the
+    chunks' counts are added to `counts`.
+    """
+    chunks = split_chunks(samples, workers)
+    logging.info(f"Analysing {len(samples)} frames in {len(chunks)} chunks with {workers} workers")
+    chunk_adaptive = [adaptive] * len(chunks)
+    if adaptive and adaptive.max_inferences is not None:
+        # Each chunk gets its own samples plus its share of the frames left to refine, the shares adding up to
+        # what's left of the cap
+        budget = max(0, adaptive.max_inferences - len(samples))
+        start = 0
+        for idx, chunk in enumerate(chunks):
+            end = start + len(chunk)
+            share = budget * end // len(samples) - budget * start // len(samples)
+            chunk_adaptive[idx] = adaptive._replace(max_inferences=len(chunk) + share)
+            start = end
+    chunk_rows = [None] * len(chunks)
+    done_counts = [0] * len(chunks)
+    next_to_write = 0
+    row_count = 0
+
+    def log_progress():
+        done = sum(done_counts)
+        chunk_states = ' '.join(
+            f"#{idx + 1}:{100 * count // len(chunk)}%"
+            for idx, (count, chunk) in enumerate(zip(done_counts, chunks))
+            if chunk_rows[idx] is None and count
+        )
+        logging.info(
+            f"Progress: {done}/{len(samples)} frames ({100 * done / len(samples):.0f}%), "
+            f"{sum(rows is not None for rows in chunk_rows)}/{len(chunks)} chunks done"
+            + (f", running chunks {chunk_states}" if chunk_states else "")
+        )
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(logging.getLogger().level,)
+    ) as executor:
+        progress = manager.Queue()
+        futures = {
+            executor.submit(
+                process_samples, video_path, chunk, epochs, fps, actions, batch_size, frames_dir, progress, idx,
+                track_every, cache,
+                chunk_adaptive[idx], max_side,
+            ): idx
+            for idx, chunk in enumerate(chunks)
+        }
+        pending = set(futures)
+        last_report = time.monotonic()
+        try:
+            while pending:
+                finished, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                while True:
+                    try:
+                        idx, count = progress.get_nowait()
+                    except queue.Empty:
+                        break
+                    done_counts[idx] = max(done_counts[idx], count)
+                for future in finished:
+                    idx = futures[future]
+                    chunk_rows[idx], chunk_counts = future.result()
+                    if counts is not None:
+                        counts.update(chunk_counts)
+                    done_counts[idx] = len(chunks[idx])
+                    first, last = chunks[idx][0][1], chunks[idx][-1][1]
+                    logging.info(
+                        f"Chunk {idx + 1}/{len(chunks)} done ({seconds_to_hms(first / fps)}-{seconds_to_hms(last / fps)}, "
+                        f"{len(chunks[idx])} frames, {len(chunk_rows[idx])} rows)"
+                    )
+                # Chunks are consecutive runs of samples, so writing them in order keeps rows in timestamp order
+                while next_to_write < len(chunks) and chunk_rows[next_to_write] is not None:
+                    write_rows(chunk_rows[next_to_write])
+                    row_count += len(chunk_rows[next_to_write])
+                    chunk_rows[next_to_write] = []
+                    next_to_write += 1
+                if finished or time.monotonic() - last_report >= PROGRESS_INTERVAL_S:
+                    log_progress()
+                    last_report = time.monotonic()
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+    return row_count
+
+def extract_emotions(video_path, output_csv, epochs=None, interval_s=0.1, save_frames=False, workers=1,
+                     actions=ACTIONS, batch_size=8, resume=False, track_every=None, cache_dir=None,
+                     cache_near_duplicates=False, adaptive=False, min_interval_s=0.1, change_threshold=10,
+                     max_inferences=None, max_side=None):
+    if adaptive and 'emotion' not in actions:
+        raise ValueError("Adaptive sampling follows emotion changes, it needs the emotion action")
+
     # Initialize video capture
     logging.info(f"Opening video {video_path}")
     cap = cv2.VideoCapture(video_path)
@@ -135,6 +1091,8 @@ def extract_emotions(video_path, output_csv, epochs=None, interval_s=0.1, save_f
     duration = frame_count / fps
     logging.info(f"Video opened: {video_path}")
     logging.info(f"FPS: {fps}, Frame count: {frame_count}, Duration: {duration:.2f}s")
+    # Frames are read by process_samples, with a capture per worker
+    cap.release()
 
     # Create a directory to save frames if in debug mode
     if save_frames:
@@ -153,89 +1111,89 @@ def extract_emotions(video_path, output_csv, epochs=None, interval_s=0.1, save_f
         epochs_sec = [(0, duration)]
 
     # Calculate the interval in terms of frames
-    frame_interval = int(interval_s * fps)
+    frame_interval = max(1, int(interval_s * fps))
     logging.info(f"Frame interval: {frame_interval} frames ({interval_s}s)")
+    if adaptive:
+        min_gap_frames = max(1, int(min_interval_s * fps))
+        adaptive = AdaptiveSampling(min_gap_frames, change_threshold, max_inferences)
+        logging.info(
+            f"Adaptive sampling: refining down to {min_gap_frames} frames ({min_interval_s}s) where emotions "
+            f"change by more than {change_threshold} points"
+            + (f", {max_inferences} frames at most" if max_inferences is not None else "")
+        )
+    else:
+        adaptive = None
 
-    # Prepare the output list
-    results = []
-
-    frame_number = 0
-    current_epoch_idx = 0
-    start_time, end_time = epochs_sec[current_epoch_idx]
-    epoch_label = f"epoch{current_epoch_idx + 1} ({epochs[current_epoch_idx]})"
-
-    while True:
-        ret, frame = cap.read()
-        timestamp = frame_number / fps
-
-        if not ret or timestamp > epochs_sec[-1][1]:
-            break
-
-        if start_time <= timestamp <= end_time:
-            if frame_number % frame_interval == 0:
-                log_prefix = f"[timestamp {timestamp:.2f}s]"
-                # Analyze the frame for emotions and demographic data
-                face_results = DeepFace.analyze(frame, actions=['emotion', 'age', 'gender', 'race'], enforce_detection=False, silent=True)
-                # Remove those with face_confidence == 0 (dunno why these show up in the first place)
-                face_results = [r for r in face_results if r['face_confidence'] > 0]
-
-                # Draw rectangle around detected face and save the frame if in debug mode
-                if save_frames:
-                    for result in face_results:
-                        region = result['region']
-                        x, y, w, h = region['x'], region['y'], region['w'], region['h']
-                        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-                    frame_filename = f"{frames_dir}/frame_{frame_number:06d}.jpg"
-                    cv2.imwrite(frame_filename, frame)
-                    logging.info(f"{log_prefix} Saved frame to {frame_filename}")
+    samples = list(sample_frame_numbers(epochs_sec, fps, frame_interval, frame_count))
+    if adaptive and max_inferences is not None and max_inferences < len(samples):
+        logging.warning(f"--max-inferences {max_inferences} leaves no room to refine the {len(samples)} frames sampled")
+    fieldnames = csv_fieldnames(actions, adaptive)
+    last_frame = read_resume_point(output_csv, fieldnames) if resume else None
+    if last_frame is not None:
+        samples = [sample for sample in samples if sample[1] > last_frame]
+        logging.info(f"Resuming after frame {last_frame} of {output_csv}: {len(samples)} frames left to analyse")
+    cache = open_result_cache(
+        cache_dir, video_path, actions, track_every, max_side, fps, cache_near_duplicates,
+    ) if cache_dir else None
 
-                logging.debug(f"{log_prefix} face_results ({len(face_results)}): {face_results}")
+    # Rows are written (and flushed) as they come, so an interrupted run can be resumed
+    with open(output_csv, mode='w' if last_frame is None else 'a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        if last_frame is None:
+            writer.writeheader()
 
-                if len(face_results) != 1:
-                    logging.warn(f"{log_prefix} Skipping because found {len(face_results)} faces")
-                else:
-                    result = face_results[0]
+        def write_rows(rows):
+            writer.writerows(rows)
+            file.flush()
 
-                    try:
-                        row = {
-                            "epoch": epoch_label,
-                            "frame": frame_number,
-                            "timestamp": seconds_to_hms(timestamp),
-                            "timestamp_seconds": timestamp,
-                            "gender": result['dominant_gender'],
-                            "race": result['dominant_race'],
-                            "age": result['age'],
-                            "emotion": result['dominant_emotion'],
-                        }
-                        row.update({f"gender:{k}": v for k, v in result['gender'].items()})
-                        row.update({f"race:{k}": v for k, v in result['race'].items()})
-                        row.update({f"emotion:{k}": v for k, v in result['emotion'].items()})
-                        logging.info(f"{log_prefix} Detected: {row['gender']} {row['race']} {row['age']} {row['emotion']}")
-                        results.append(row)
-
-                    except:
-                        raise ValueError(f"{log_prefix} Unexpected result format at {timestamp:.2f}s: {result}")
-
-        if timestamp > end_time and current_epoch_idx < len(epochs_sec) - 1:
-            current_epoch_idx += 1
-            start_time, end_time = epochs_sec[current_epoch_idx]
-            epoch_label = f"epoch{current_epoch_idx + 1} ({epochs[current_epoch_idx]})"
-
-        frame_number += 1
-
-    # Release the video capture object
-    cap.release()
+        counts = Counter()
+        try:
+            if workers > 1 and samples:
+                row_count = process_parallel(
+                    video_path, samples, epochs, fps, actions, batch_size, frames_dir, workers, write_rows,
+                    track_every, cache, adaptive, max_side, counts,
+                )
+            else:
+                row_count = 0
+                for row in iter_sample_rows(
+                    video_path, samples, epochs, fps, actions, batch_size, frames_dir,
+                    track_every=track_every, cache=cache, adaptive=adaptive, max_side=max_side, counts=counts,
+                ):
+                    write_rows([row])
+                    row_count += 1
+        except KeyboardInterrupt:
+            logging.warning(f"Interrupted: rows so far are in {output_csv}, add --resume to continue from there")
+            raise
 
-    # Write the results to a CSV file
-    with open(output_csv, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=results[0].keys())
-        writer.writeheader()
-        writer.writerows(results)
-
-    logging.info(f"Results saved to {output_csv}")
+    logging.info(f"Results saved to {output_csv} ({row_count} rows written)")
+    if adaptive:
+        logging.info(f"Adaptive sampling: {len(samples)} frames sampled, {counts['refined']} more in between")
+    if track_every:
+        frames = counts['detected'] + counts['tracked']
+        logging.info(
+            f"Face tracking: detection skipped on {counts['tracked']}/{frames} frames "
+            f"({100 * counts['tracked'] / max(1, frames):.0f}%), "
+            f"tracking lost on {counts['lost']} frames"
+        )
+    if cache:
+        logging.info(
+            f"Cache: {counts['cached']}/{len(samples) + counts['refined']} frames from the cache, "
+            f"{counts['near duplicate']} from a near-duplicate frame"
+        )
     if save_frames:
         logging.info(f"Frames saved in directory: {frames_dir}")
 
 if __name__ == "__main__":
-    extract_emotions(args.video_path, args.output_csv, args.epochs, args.interval, save_frames=args.debug)
\ No newline at end of file
+    args = parser.parse_args()
+
+    # Set logging level based on debug flag
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+
+    extract_emotions(
+        args.video_path, args.output_csv, args.epochs, args.interval, save_frames=args.debug, workers=args.workers,
+        actions=args.actions, batch_size=args.batch_size, resume=args.resume, track_every=args.track,
+        cache_dir=args.cache, cache_near_duplicates=args.cache_near_duplicates, adaptive=args.adaptive,
+        min_interval_s=args.min_interval, change_threshold=args.change_threshold, max_inferences=args.max_inferences,
+        max_side=args.max_side,
+    )
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# This script benchmarks convert_csv.py on synthetic logs (see generate_fisher_log.py) of growing size, and
+# records the throughput and peak memory of each conversion as JSON, to compare runs over time.
+# Usage:
+#     python3 benchmark_convert_csv.py --output benchmarks.json
+#     python3 benchmark_convert_csv.py --sizes 1M,10M --face-rates 0.2,0.9 --emotions 7,20 --output benchmarks.json
+# Every combination of --sizes, --face-rates and --emotions is a case. Each conversion runs in a fresh
+# process, so its peak resident memory can be measured on its own; the best of --repeat runs is kept.
+# Each invocation appends one run (with the commit, Python version and machine) to the --output file, and
+# prints how every case compares to the same case in the previous run of that file.
+# Generated logs are kept in --log-dir (default: a temporary directory) and reused when they already exist.
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from convert_csv import simplified_path
+from generate_fisher_log import generate_log, parse_size
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child process: converts one log and reports its own time and peak memory
+CHILD_CODE = """
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+from convert_csv import _convert_file
+start = time.perf_counter()
+output_path, rows = _convert_file(sys.argv[2], stats=sys.argv[3] == '1')
+seconds = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is in kilobytes on Linux but in bytes on macOS
+peak_bytes = peak if sys.platform == 'darwin' else peak * 1024
+print(json.dumps({'seconds': seconds, 'rows': rows, 'peak_rss_bytes': peak_bytes}))
+"""
+
+
+def case_key(case):
+    return (case['size'], case['face_rate'], case['emotions'], case['stats'])
+
+
+def log_path(log_dir, size, face_rate, emotions, seed):
+    path = os.path.join(log_dir, f'FISHER_results_bench_{size}_{face_rate}_{emotions}_{seed}.csv')
+    if not os.path.exists(path):
+        print(f"Generating {path}", file=sys.stderr)
+        with open(path + '.tmp', 'w') as output:
+            generate_log(output, size=size, face_rate=face_rate, emotions=emotions, seed=seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def run_case(path, stats, repeat):
+    """Convert `path` `repeat` times in fresh processes, returning the fastest run's measurements."""
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', CHILD_CODE, SCRIPTS_DIR, path, '1' if stats else '0'],
+            check=True, capture_output=True, text=True,
+        )
+        measurement = json.loads(completed.stdout)
+        if best is None or measurement['seconds'] < best['seconds']:
+            best = measurement
+    os.remove(simplified_path(path))
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=SCRIPTS_DIR, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_runs(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark convert_csv.py on synthetic logs.")
+    parser.add_argument('--sizes', default='1M,10M,100M,1G', help="Comma-separated log sizes. Default: %(default)s")
+    parser.add_argument('--face-rates', default='0.9', help="Comma-separated face detection rates. Default: %(default)s")
+    parser.add_argument('--emotions', default='7', help="Comma-separated numbers of emotions. Default: %(default)s")
+    parser.add_argument('--stats', action='store_true', help="Benchmark conversion with the --stats columns.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept. Default: %(default)s")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-dir', help="Where to keep the generated logs. Default: a temporary directory.")
+    parser.add_argument('--output', required=True, help="JSON file to append this run's results to.")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    face_rates = [float(rate) for rate in args.face_rates.split(',')]
+    emotions = [int(count) for count in args.emotions.split(',')]
+
+    runs = load_runs(args.output)
+    previous = {case_key(case): case for case in runs[-1]['cases']} if runs else {}
+    run = {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        'cases': [],
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_dir = args.log_dir or temp_dir
+        os.makedirs(log_dir, exist_ok=True)
+        for size, face_rate, emotion_count in itertools.product(sizes, face_rates, emotions):
+            path = log_path(log_dir, size, face_rate, emotion_count, args.seed)
+            measurement = run_case(path, args.stats, args.repeat)
+            file_size = os.path.getsize(path)
+            case = {
+                'size': size,
+                'face_rate': face_rate,
+                'emotions': emotion_count,
+                'stats': args.stats,
+                'file_bytes': file_size,
+                'rows': measurement['rows'],
+                'seconds': round(measurement['seconds'], 4),
+                'mb_per_s': round(file_size / measurement['seconds'] / 1e6, 2),
+                'rows_per_s': round(measurement['rows'] / measurement['seconds']),
+                'peak_rss_mb': round(measurement['peak_rss_bytes'] / 1e6, 1),
+            }
+            run['cases'].append(case)
+
+            line = (
+                f"{file_size / 1e6:9.1f} MB  face rate {face_rate:<4}  {emotion_count:3} emotions: "
+                f"{case['mb_per_s']:7.2f} MB/s  {case['rows_per_s']:9} rows/s  peak {case['peak_rss_mb']:7.1f} MB"
+            )
+            before = previous.get(case_key(case))
+            if before:
+                line += (
+                    f"  (throughput x{case['mb_per_s'] / before['mb_per_s']:.2f}, "
+                    f"memory x{case['peak_rss_mb'] / before['peak_rss_mb']:.2f} vs previous run)"
+                )
+            print(line)
+
+    runs.append(run)
+    with open(args.output, 'w') as file:
+        json.dump(runs, file, indent=2)
+    print(f"Saved results to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
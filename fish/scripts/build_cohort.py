@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# This script gathers many FISHER sessions into one columnar cohort dataset, so that a whole study can be
+# loaded for analysis without re-reading and re-parsing thousands of text files.
+# Usage:
+#     python3 build_cohort.py <cohort_dir> <inputs> ...
+# Inputs are raw logs (optionally .gz/.zst compressed) or `_simplified.csv` files named
+# `FISHER_results_<subject_id>_<session_number>.csv` (or `..._simplified.csv`), given as files, directories
+# or glob patterns like for convert_csv.py (except that `_simplified.csv` files in directories and globs are
+# included too; when a session has both, its raw log is used). Other CSV files found in directories and globs
+# are skipped with a warning. Running it again on the same <cohort_dir> appends the new sessions; sessions
+# already in the dataset are skipped.
+#
+# Layout of <cohort_dir>:
+#     schema.json   number of rows, column types, dictionaries and the list of sessions already ingested
+#     <column>.bin  one file per column, holding float64 or int64 values, or int32 dictionary codes for
+#                   subject_id, session_number and starfish_image (-1 when missing)
+#
+# Reading a subset of columns from Python only touches those columns' files:
+#     from build_cohort import read_columns
+#     columns = read_columns('cohort', ['subject_id', 'happy'])
+
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+from array import array
+
+from convert_csv import COMPRESSED_SUFFIXES, EMOTIONS, expand_inputs, iter_trials, open_raw
+
+SCHEMA_NAME = 'schema.json'
+SESSION_FILE_PATTERN = re.compile(r'FISHER_results_(.+)_([^_]+)\.csv$')
+TYPECODES = {'float': 'd', 'int': 'q', 'dict': 'i'}
+COLUMNS = [
+    ('subject_id', 'dict'),
+    ('session_number', 'dict'),
+    ('trial_number', 'int'),
+    *[(emotion, 'float') for emotion in EMOTIONS],
+    ('Average Happy', 'float'),
+    ('Face detected', 'int'),
+    ('No face detected', 'int'),
+    ('Fish clicked correctly', 'int'),
+    ('Fish clicked incorrectly', 'int'),
+    ('starfish_image', 'dict'),
+]
+
+
+def parse_session_name(file_path):
+    """Return (subject_id, session_number) from a FISHER_results_<subject>_<session> file name."""
+    file_name = os.path.basename(file_path)
+    for suffix in COMPRESSED_SUFFIXES:
+        if file_name.endswith(suffix):
+            file_name = file_name[:-len(suffix)]
+    file_name = file_name.replace('_simplified.csv', '.csv')
+    match = SESSION_FILE_PATTERN.search(file_name)
+    if not match:
+        raise ValueError(f"Can't get subject and session from file name: {file_path}")
+    return match.group(1), match.group(2)
+
+
+def session_files(file_paths, explicit=()):
+    """One file per session, in the order given: the raw log when there's both it and its `_simplified.csv`.
+
+    Files whose names aren't session names are skipped with a warning, unless they are in `explicit` (the
+    paths the user named), which raises ValueError.
+    """
+    chosen = {}
+    for file_path in file_paths:
+        try:
+            session = parse_session_name(file_path)
+        except ValueError:
+            if file_path in explicit:
+                raise
+            print(f"Skipping {file_path}: not a FISHER_results_<subject>_<session> file", file=sys.stderr)
+            continue
+        if session not in chosen or chosen[session].endswith('_simplified.csv'):
+            chosen[session] = file_path
+    return [file_path for file_path in file_paths if file_path in chosen.values()]
+
+
+def read_session_trials(file_path):
+    """One dict per trial, from either a raw log or its `_simplified.csv`."""
+    with open_raw(file_path) as file:
+        if file_path.endswith('_simplified.csv'):
+            return list(csv.DictReader(file))
+        return list(iter_trials(csv.reader(file)))
+
+
+def _column_path(cohort_dir, name):
+    return os.path.join(cohort_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.bin')
+
+
+def _to_float(value):
+    if value is None or value == 'nan' or value == '':
+        return math.nan
+    return float(value)
+
+
+def _to_category(value):
+    # str(None) is what convert_csv writes for a trial without a starfish
+    if value is None or value == '' or value == 'None':
+        return None
+    return str(value)
+
+
+def load_schema(cohort_dir):
+    try:
+        with open(os.path.join(cohort_dir, SCHEMA_NAME)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {
+            'row_count': 0,
+            'byteorder': sys.byteorder,
+            'columns': [{'name': name, 'type': kind} for name, kind in COLUMNS],
+            'dictionaries': {name: [] for name, kind in COLUMNS if kind == 'dict'},
+            'sessions': {},
+        }
+
+
+def _save_schema(cohort_dir, schema):
+    # The schema is written last and atomically: it is what makes appended rows visible
+    fd, tmp_path = tempfile.mkstemp(dir=cohort_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(schema, file, indent=2)
+    os.replace(tmp_path, os.path.join(cohort_dir, SCHEMA_NAME))
+
+
+def append_sessions(cohort_dir, file_paths):
+    """Append the trials of every session not in the dataset yet. Returns (added, skipped) file lists."""
+    os.makedirs(cohort_dir, exist_ok=True)
+    schema = load_schema(cohort_dir)
+    columns = {column['name']: column['type'] for column in schema['columns']}
+    dictionaries = schema['dictionaries']
+    codes = {name: {value: code for code, value in enumerate(values)} for name, values in dictionaries.items()}
+    buffers = {name: array(TYPECODES[kind]) for name, kind in columns.items()}
+
+    def encode(name, value):
+        if value is None:
+            return -1
+        if value not in codes[name]:
+            codes[name][value] = len(dictionaries[name])
+            dictionaries[name].append(value)
+        return codes[name][value]
+
+    added, skipped = [], []
+    new_rows = 0
+    for file_path in file_paths:
+        subject_id, session_number = parse_session_name(file_path)
+        session_key = f"{subject_id}/{session_number}"
+        if session_key in schema['sessions']:
+            skipped.append(file_path)
+            continue
+        trials = read_session_trials(file_path)
+        for trial in trials:
+            trial = {**trial, 'subject_id': subject_id, 'session_number': session_number}
+            for name, kind in columns.items():
+                value = trial.get(name)
+                if kind == 'dict':
+                    buffers[name].append(encode(name, _to_category(value)))
+                elif kind == 'int':
+                    buffers[name].append(int(value))
+                else:
+                    buffers[name].append(_to_float(value))
+        schema['sessions'][session_key] = {'source': os.path.basename(file_path), 'rows': len(trials)}
+        new_rows += len(trials)
+        added.append(file_path)
+
+    for name, buffer in buffers.items():
+        if schema['byteorder'] != sys.byteorder:
+            buffer.byteswap()
+        with open(_column_path(cohort_dir, name), 'ab') as file:
+            # Drop anything past row_count, left over by an append that died before saving the schema
+            file.truncate(schema['row_count'] * buffer.itemsize)
+            buffer.tofile(file)
+    schema['row_count'] += new_rows
+    _save_schema(cohort_dir, schema)
+    return added, skipped
+
+
+def read_columns(cohort_dir, columns=None, decode=True):
+    """Read some (default: all) columns into a dict of name -> values.
+
+    Numeric columns come back as arrays (float64 'd' or int64 'q'). Dictionary-encoded columns come back
+    as lists of values (None when missing), or as their int32 code arrays with decode=False; the code
+    dictionaries are in load_schema(cohort_dir)['dictionaries'].
+    """
+    schema = load_schema(cohort_dir)
+    kinds = {column['name']: column['type'] for column in schema['columns']}
+    result = {}
+    for name in columns or kinds:
+        if name not in kinds:
+            raise KeyError(f"No column {name!r} in {cohort_dir}")
+        values = array(TYPECODES[kinds[name]])
+        if schema['row_count']:
+            with open(_column_path(cohort_dir, name), 'rb') as file:
+                values.fromfile(file, schema['row_count'])
+        if schema['byteorder'] != sys.byteorder:
+            values.byteswap()
+        if kinds[name] == 'dict' and decode:
+            dictionary = schema['dictionaries'][name]
+            values = [dictionary[code] if code >= 0 else None for code in values]
+        result[name] = values
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append FISHER sessions to a columnar cohort dataset.")
+    parser.add_argument('cohort_dir', help="Directory of the cohort dataset (created if needed).")
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help="Raw or _simplified.csv session files, directories (searched recursively) or glob patterns.",
+    )
+    args = parser.parse_args(argv)
+
+    file_paths = session_files(expand_inputs(args.inputs, keep_simplified=True), explicit=args.inputs)
+    if not file_paths:
+        print("No input files found.", file=sys.stderr)
+        return 1
+    added, skipped = append_sessions(args.cohort_dir, file_paths)
+    for file_path in added:
+        print(f"Added {file_path}")
+    for file_path in skipped:
+        print(f"Skipped {file_path} (session already in the dataset)")
+    schema = load_schema(args.cohort_dir)
+    print(
+        f"{args.cohort_dir}: {schema['row_count']} trials from {len(schema['sessions'])} sessions "
+        f"({len(added)} added, {len(skipped)} skipped)"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,125 +4,584 @@
 # The simplified format has one row per trial, with columns for each emotion's average value, and other relevant data.
 # Usage:
 #     python3 convert_csv.py <path_to_raw_csv>
-# Can also convert multiple files at once:
+# Can also convert multiple files at once, in parallel across processes. Inputs can be files, directories
+# (searched recursively for raw .csv files) or glob patterns:
 #     python3 convert_csv.py <path_to_raw_csv_1> <path_to_raw_csv_2> ...
+#     python3 convert_csv.py results/ 'wave2/FISHER_results_*.csv' --jobs 8
 # This will create a new file with the same name as the input file(s), but with '_simplified' appended to the name.
+# Raw logs compressed as .csv.gz (or .csv.zst, with the `zstandard` package installed) are read directly, without
+# a decompressed copy on disk. `-` reads a raw log from stdin and writes the simplified CSV to stdout:
+#     zstdcat FISHER_results_p01_1.csv.zst | python3 convert_csv.py - > p01_1.csv
+#
+# From Python, simplify() turns any file-like object or iterable of rows into simplified trial dicts, lazily:
+#     from convert_csv import open_raw, simplify
+#     for trial in simplify(open_raw('FISHER_results_p01_1.csv.gz')): ...
+# A file that fails to convert is reported and the others carry on; a throughput summary is printed at the end.
+#
+# When run as a script, conversions are cached: a `.convert_csv_manifest.json` in each input directory records
+# the content hash of every converted input and the version of the conversion logic. Inputs whose content and
+# conversion logic haven't changed since, and whose `_simplified.csv` is still there, are skipped. Changing the
+# aggregation code (e.g. the emotion list or the 'Average happy' handling) invalidates the cache automatically;
+# pass --force to reconvert everything anyway.
+#
+# Pass --stats to add richer per-trial statistics after the usual columns: the median, (population) standard
+# deviation, min, max and time-weighted average of each emotion, and the ratio of face detections. The
+# time-weighted average weights each sample by how long it held, i.e. until the next face detection attempt
+# (or the trial's last row), using the row timestamps. The statistics are computed for all emotions of a trial
+# at once with numpy when it's installed, in pure Python otherwise.
+#
+# The raw log is read in a single streaming pass: each trial is aggregated with running sums and counts
+# as its rows arrive, and its simplified row is written as soon as the next 'Trial started' is seen. So
+# memory use doesn't grow with the length of the session.
 
+import argparse
 import csv
-from statistics import mean
+import datetime
+import functools
+import glob
+import gzip
+import hashlib
+import inspect
+import itertools
+import json
+import math
+import os
 import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+try:
+    import numpy as np
+except ImportError:
+    # --stats then computes its statistics in pure Python, more slowly
+    np = None
 
-def convert_csv(file_path):
-    print(f"Converting {file_path}")
-    with open(file_path, 'r') as file:
-        rows = list(csv.reader(file))
+# Note we hardcode the emotion names here in case some/all trials don't have detected faces
+EMOTIONS = ['neutral', 'happy', 'sad', 'angry', 'fearful', 'disgusted', 'surprised']
+
+# Bump to force reconversion when the output changes for reasons the code fingerprint can't see
+CONVERTER_VERSION = 1
+MANIFEST_NAME = '.convert_csv_manifest.json'
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+# Every finite double is an integer multiple of 2**-1074, so scaling by 2**1074 makes sums exact.
+_EXACT_SCALE_BITS = 1074
+
+
+class RunningMean:
+    """Mean of a stream of floats without keeping the values.
+
+    Gives exactly the same result as statistics.mean, which averages the exact (rational) sum:
+    a plain float running sum can be off by an ulp, which is enough to flip a round(x, 2).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.exact_sum = 0
+        self.non_finite_sum = None
+
+    def add(self, value):
+        self.count += 1
+        if not math.isfinite(value):
+            # nan/inf propagate the same way they do in statistics.mean
+            self.non_finite_sum = value if self.non_finite_sum is None else self.non_finite_sum + value
+            return
+        numerator, denominator = value.as_integer_ratio()
+        self.exact_sum += numerator << (_EXACT_SCALE_BITS - denominator.bit_length() + 1)
+
+    def mean(self):
+        if self.non_finite_sum is not None:
+            return self.non_finite_sum
+        # Integer true division is correctly rounded, like converting the exact Fraction to float
+        return self.exact_sum / (self.count << _EXACT_SCALE_BITS)
+
+
+STATISTICS = ('median', 'std', 'min', 'max', 'time-weighted')
+
+
+@functools.lru_cache(maxsize=64)
+def _day_start(date):
+    return datetime.datetime.fromisoformat(date).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def parse_timestamp(timestamp):
+    """Seconds since the epoch from a log timestamp like 2024-09-23T21:55:17.544Z."""
+    # The logs' own UTC format is parsed by hand (once per day for the date), anything else by datetime
+    if len(timestamp) >= 20 and timestamp[10] == 'T' and timestamp[13] == ':' and timestamp.endswith('Z'):
+        try:
+            return (
+                _day_start(timestamp[:10]) + int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60
+                + float(timestamp[17:-1])
+            )
+        except ValueError:
+            pass
+    return datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+
+def _rounded(value):
+    return 'nan' if math.isnan(value) else round(value, 2)
+
+
+def sample_statistics(values, durations):
+    """Median, std, min, max and time-weighted average of one emotion's samples in a trial.
+
+    `values` and `durations` are parallel float64 arrays, nan marking samples without this emotion.
+    """
+    samples = [(value, duration) for value, duration in zip(values, durations) if not math.isnan(value)]
+    if not samples:
+        return {name: 'nan' for name in STATISTICS}
+    present = sorted(value for value, _ in samples)
+    count = len(present)
+    middle = count // 2
+    median = present[middle] if count % 2 else (present[middle - 1] + present[middle]) / 2
+    mean = math.fsum(present) / count
+    std = math.sqrt(math.fsum((value - mean) ** 2 for value in present) / count)
+    total_weight = math.fsum(duration for _, duration in samples)
+    time_weighted = (
+        math.fsum(value * duration for value, duration in samples) / total_weight if total_weight > 0 else math.nan
+    )
+    return {
+        'median': _rounded(median),
+        'std': _rounded(std),
+        'min': _rounded(present[0]),
+        'max': _rounded(present[-1]),
+        'time-weighted': _rounded(time_weighted),
+    }
 
-    # Initialize structures to store parsed data
-    trials_data = []
-    current_trial_data = []
+
+def trial_statistics(samples, durations):
+    """sample_statistics of every emotion: {emotion: {statistic: value}}, in bulk with numpy if available."""
+    if np is None or not len(durations):
+        return {emotion: sample_statistics(values, durations) for emotion, values in samples.items()}
+    # One row per emotion, one column per sample. nan sorts last, so each row's samples come first in order.
+    matrix = np.vstack([np.frombuffer(values, dtype=np.float64) for values in samples.values()])
+    weights = np.frombuffer(durations, dtype=np.float64)
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=1)
+    ordered = np.sort(matrix, axis=1)
+    rows = np.arange(len(matrix))
+    low, high = np.maximum(counts - 1, 0) // 2, counts // 2
+    values = np.where(present, matrix, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Emotions without any sample give nan
+        means = values.sum(axis=1) / counts
+        total_weights = (present * weights).sum(axis=1)
+        columns = {
+            'median': (ordered[rows, low] + ordered[rows, high]) / 2,
+            'std': np.sqrt(np.where(present, (matrix - means[:, None]) ** 2, 0.0).sum(axis=1) / counts),
+            'min': ordered[:, 0],
+            'max': ordered[rows, np.maximum(counts - 1, 0)],
+            'time-weighted': np.where(total_weights > 0, values @ weights / total_weights, np.nan),
+        }
+    return {
+        emotion: {name: _rounded(float(columns[name][row])) for name in STATISTICS}
+        for row, emotion in enumerate(samples)
+    }
+
+
+class TrialAggregator:
+    """Running aggregates for one trial, fed one raw row at a time.
+
+    With detailed=True it also keeps the trial's samples for the --stats columns: one float64 array per
+    emotion with a row per 'Face detected' event (nan where the event lacks that emotion), and a parallel
+    array with how long each sample held.
+    """
+
+    def __init__(self, trial_number, detailed=False):
+        self.trial_number = trial_number
+        self.emotions = {emotion: RunningMean() for emotion in EMOTIONS}
+        self.face_detected_count = 0
+        self.no_face_detected_count = 0
+        self.starfish_image = None
+        # TODO total happy and fearful
+        self.average_happy = None
+        self.fish_clicked_correctly_count = 0
+        self.fish_clicked_incorrectly_count = 0
+        self.detailed = detailed
+        self.samples = {emotion: array('d') for emotion in EMOTIONS}
+        self.durations = array('d')
+        self.sample_start = None
+        self.last_timestamp = None
+
+    def add(self, event, metadata, timestamp=None):
+        if self.detailed and timestamp:
+            # Timestamps are only parsed when needed: at face detection attempts, and for the trial's last row
+            self.last_timestamp = timestamp
+            # A sample holds until the next face detection attempt, with or without a face
+            if event in ('Face detected', 'No face detected'):
+                now = parse_timestamp(timestamp)
+                if self.sample_start is not None:
+                    self.durations[-1] = now - self.sample_start
+                self.sample_start = now if event == 'Face detected' else None
+        if event == 'Face detected':
+            self.face_detected_count += 1
+            for i in range(0, len(metadata), 2):
+                emotion = metadata[i]
+                if not emotion:
+                    break
+                value = float(metadata[i+1])
+                if emotion not in self.emotions:
+                    self.emotions[emotion] = RunningMean()
+                self.emotions[emotion].add(value)
+                if self.detailed:
+                    if emotion not in self.samples:
+                        self.samples[emotion] = array('d', [math.nan] * len(self.durations))
+                    self.samples[emotion].append(value)
+            if self.detailed:
+                self.durations.append(0.0)
+                for column in self.samples.values():
+                    if len(column) < len(self.durations):
+                        column.append(math.nan)
+        elif event == 'No face detected':
+            self.no_face_detected_count += 1
+        elif event == 'Starfish appeared':
+            self.starfish_image = metadata[0]
+        # TODO account for multiple fish clicks, and so multiple 'Average happy' events
+        elif event == 'Average happy' and self.average_happy is None:
+            if metadata and metadata[0] and metadata[0] != "null":
+                self.average_happy = float(metadata[0])
+            else:
+                self.average_happy = None
+        elif event == 'Fish clicked correctly':
+            self.fish_clicked_correctly_count += 1
+        elif event == 'Fish clicked incorrectly':
+            self.fish_clicked_incorrectly_count += 1
+
+    def result(self):
+        trial_dict = {}
+        trial_dict['trial_number'] = self.trial_number
+
+        # Calculate average value for each emotion
+        for emotion, running_mean in self.emotions.items():
+            average_value = round(running_mean.mean(), 2) if running_mean.count else 'nan'
+            trial_dict[emotion] = average_value
+
+        trial_dict['Average Happy'] = round(self.average_happy, 2) if self.average_happy else 'nan'
+        trial_dict['Face detected'] = self.face_detected_count
+        trial_dict['No face detected'] = self.no_face_detected_count
+        trial_dict['Fish clicked correctly'] = self.fish_clicked_correctly_count
+        trial_dict['Fish clicked incorrectly'] = self.fish_clicked_incorrectly_count
+        trial_dict['starfish_image'] = self.starfish_image
+
+        if self.detailed:
+            if self.sample_start is not None:
+                self.durations[-1] = parse_timestamp(self.last_timestamp) - self.sample_start
+            for emotion, statistics in trial_statistics(self.samples, self.durations).items():
+                for name, value in statistics.items():
+                    trial_dict[f'{emotion} {name}'] = value
+            detection_count = self.face_detected_count + self.no_face_detected_count
+            trial_dict['Face detected ratio'] = (
+                round(self.face_detected_count / detection_count, 2) if detection_count else 'nan'
+            )
+        return trial_dict
+
+
+def iter_trials(rows, stats=False):
+    """Yield one simplified dict per trial from raw CSV rows, as soon as each trial ends.
+
+    Rows before the first 'Trial started' are ignored, and so are trials without any rows.
+    With stats, each dict also has the richer statistics columns (see TrialAggregator).
+    """
     trial_number = None
+    current_trial = None
 
-    # Parse each line based on its type
     for row in rows:
         if len(row) < 3:
             continue
-        timestamp = row[0]
         event = row[1]
         if event == "Trial started":
             # Starting new trial
             trial_number = int(row[2])
-            if current_trial_data:
-                # Save previous trial data before starting new
-                trials_data.append(current_trial_data)
-                current_trial_data = []
+            if current_trial is not None:
+                yield current_trial.result()
+                current_trial = None
         elif trial_number is not None:
             # Accumulate data for the current trial
-            metadata = row[2:]
-            structured_data = {'timestamp': timestamp, 'event': event, 'metadata': metadata, 'trial_number': trial_number}
-            current_trial_data.append(structured_data)
+            if current_trial is None:
+                current_trial = TrialAggregator(trial_number, detailed=stats)
+            current_trial.add(event, row[2:], row[0])
 
     # Handle last trial if any
-    if current_trial_data:
-        trials_data.append(current_trial_data)
-
-    # Simplify the data by processing each trial's data
-    simplified_data = []
-    for trial in trials_data:
-        trial_number = trial[0]['trial_number']
-        # Note we hardcode the emotion names here in case some/all trials don't have detected faces
-        emotions_dict = {
-            'neutral': [],
-            'happy': [],
-            'sad': [],
-            'angry': [],
-            'fearful': [],
-            'disgusted': [],
-            'surprised': []
-        }
-        face_detected_count = 0
-        no_face_detected_count = 0
-        starfish_image = None
-        # TODO total happy and fearful
-        average_happy = None
-        fish_clicked_correctly_count = 0
-        fish_clicked_incorrectly_count = 0
-
-        for data in trial:
-            if data['event'] == 'Face detected':
-                face_detected_count += 1
-                emotions = data['metadata']
-                for i in range(0, len(emotions), 2):
-                    emotion = emotions[i]
-                    if not emotion:
-                        break
-                    value = float(emotions[i+1])
-                    if emotion not in emotions_dict:
-                        emotions_dict[emotion] = []
-                    emotions_dict[emotion].append(value)
-            if data['event'] == 'No face detected':
-                no_face_detected_count += 1
-            if data['event'] == 'Starfish appeared':
-                starfish_image = data['metadata'][0]
-            # TODO account for multiple fish clicks, and so multiple 'Average happy' events
-            if data['event'] == 'Average happy' and average_happy is None:
-                if data['metadata'] and data['metadata'][0] and data['metadata'][0] != "null":
-                    average_happy = float(data['metadata'][0])
-                else:
-                    average_happy = None
-            if data['event'] == 'Fish clicked correctly':
-                fish_clicked_correctly_count += 1
-            if data['event'] == 'Fish clicked incorrectly':
-                fish_clicked_incorrectly_count += 1
+    if current_trial is not None:
+        yield current_trial.result()
 
-        trial_dict = {}
-        trial_dict['trial_number'] = trial_number
 
-        # Calculate average value for each emotion in emotions_dict
-        for emotion, values in emotions_dict.items():
-            average_value = round(mean(values), 2) if values else 'nan'
-            trial_dict[emotion] = average_value
+def simplify(source, stats=False):
+    """Yield one simplified dict per trial, lazily, from a raw log.
+
+    `source` is a file-like object (text, or binary in UTF-8) or any iterable of text lines, or an iterable
+    of rows already split into fields (like a csv.reader).
+    """
+    rows = iter(source)
+    first = next(rows, None)
+    if first is None:
+        return
+    if isinstance(first, (bytes, bytearray)):
+        # e.g. sys.stdin.buffer, or gzip.open() in its default binary mode
+        rows = (line.decode('utf-8') for line in itertools.chain([first], rows))
+        first = next(rows)
+    rows = itertools.chain([first], rows)
+    if isinstance(first, str):
+        rows = csv.reader(rows)
+    yield from iter_trials(rows, stats)
+
+
+def write_simplified(trials, output_file):
+    """Write trial dicts as simplified CSV to a text file, returning the number of trials written."""
+    count = 0
+    for trial in trials:
+        if not count:
+            # Use first trial's data to get the column names
+            output_file.write(','.join(trial.keys()) + '\n')
+        output_file.write(','.join(str(value) for value in trial.values()) + '\n')
+        count += 1
+    return count
+
+
+def open_raw(file_path):
+    """Open a raw log for reading as text, decompressing .gz and .zst files on the fly."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt')
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"Reading {file_path} needs the zstandard package: pip install zstandard") from None
+        return zstandard.open(file_path, 'rt')
+    return open(file_path, 'r')
+
+
+def simplified_path(file_path):
+    """Output path for a raw log: `x.csv` (or `x.csv.gz`, `x.csv.zst`) gives `x_simplified.csv`."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if file_path.endswith(suffix):
+            file_path = file_path[:-len(suffix)]
+    if file_path.endswith('.csv'):
+        file_path = file_path[:-len('.csv')]
+    return file_path + '_simplified.csv'
 
-        trial_dict['Average Happy'] = round(average_happy, 2) if average_happy else 'nan'
-        trial_dict['Face detected'] = face_detected_count
-        trial_dict['No face detected'] = no_face_detected_count
-        trial_dict['Fish clicked correctly'] = fish_clicked_correctly_count
-        trial_dict['Fish clicked incorrectly'] = fish_clicked_incorrectly_count
-        trial_dict['starfish_image'] = starfish_image
-        simplified_data.append(trial_dict)
-
-    # Output file path
-    output_path = file_path.replace('.csv', '_simplified.csv')
-    with open(output_path, 'w') as output_file:
-        # Use first trial's data to get the column names
-        output_file.write(','.join(simplified_data[0].keys()) + '\n')
-        for trial in simplified_data:
-            output_file.write(','.join(str(value) for value in trial.values()) + '\n')
+
+def _convert_file(file_path, stats=False):
+    """Convert one raw CSV file, returning the output path and the number of raw lines read."""
+    output_path = simplified_path(file_path)
+    try:
+        with open_raw(file_path) as file, open(output_path, 'w') as output_file:
+            reader = csv.reader(file)
+            if not write_simplified(iter_trials(reader, stats), output_file):
+                raise ValueError(f"No trials found in {file_path}")
+    except Exception:
+        # Don't leave a partial output behind that could be mistaken for a converted file
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path, reader.line_num
+
+
+def convert_csv(file_path, stats=False):
+    print(f"Converting {file_path}")
+    output_path, _ = _convert_file(file_path, stats)
     print("Wrote to file:", output_path)
 
     return output_path
 
+
+def expand_inputs(inputs, keep_simplified=False):
+    """Expand files, directories (recursively) and glob patterns into raw CSV paths, without duplicates.
+
+    `_simplified.csv` files found in directories or by globs are left out, unless keep_simplified.
+    """
+    file_paths = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(
+                path
+                for pattern in ('*.csv', *(f'*.csv{suffix}' for suffix in COMPRESSED_SUFFIXES))
+                for path in glob.glob(os.path.join(item, '**', pattern), recursive=True)
+            )
+        elif os.path.exists(item):
+            matches = [item]
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+        for path in matches:
+            # Skip our own outputs when scanning directories or globs
+            if not keep_simplified and path != item and path.endswith('_simplified.csv'):
+                continue
+            file_paths.setdefault(path, None)
+    return list(file_paths)
+
+
+@functools.lru_cache(maxsize=None)
+def converter_fingerprint():
+    """Hash of everything that decides the output, so cached conversions go stale when it changes."""
+    parts = [str(CONVERTER_VERSION), ','.join(EMOTIONS)]
+    parts += [
+        inspect.getsource(obj)
+        for obj in (
+            RunningMean, parse_timestamp, sample_statistics, trial_statistics, TrialAggregator, iter_trials, write_simplified, _convert_file,
+        )
+    ]
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(directory, manifest):
+    # Write to a temp file and rename, so an interrupted run can't leave a corrupt manifest
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+
+def _convert_worker(file_path, cached=None, fingerprint=None, stats=False):
+    result = {'file_path': file_path, 'output_path': None, 'rows': 0, 'error': None, 'sha256': None, 'skipped': False}
+    try:
+        if fingerprint is not None:
+            result['sha256'] = file_sha256(file_path)
+            output_path = simplified_path(file_path)
+            if (
+                cached is not None
+                and cached.get('sha256') == result['sha256']
+                and cached.get('converter') == fingerprint
+                and cached.get('stats', False) == stats
+                and os.path.exists(output_path)
+            ):
+                result.update(output_path=output_path, skipped=True)
+                return result
+        result['output_path'], result['rows'] = _convert_file(file_path, stats)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def convert_many(file_paths, jobs=None, use_cache=False, force=False, stats=False):
+    """Convert files across a process pool, yielding one result dict per file as it finishes.
+
+    With stats, the outputs also get the richer per-trial statistics columns.
+
+    With use_cache, inputs unchanged since their last conversion (per the manifest in their directory)
+    are skipped unless force is set, and the manifests are updated once all files are done.
+    """
+    fingerprint = converter_fingerprint() if use_cache else None
+    manifests = {}
+    tasks = []
+    for file_path in file_paths:
+        cached = None
+        if use_cache:
+            directory = os.path.dirname(os.path.abspath(file_path))
+            if directory not in manifests:
+                manifests[directory] = load_manifest(directory)
+            if not force:
+                cached = manifests[directory].get(os.path.basename(file_path))
+        tasks.append((file_path, cached, fingerprint, stats))
+
+    if jobs == 1 or len(tasks) <= 1:
+        results = (_convert_worker(*task) for task in tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        futures = [executor.submit(_convert_worker, *task) for task in tasks]
+        results = (future.result() for future in as_completed(futures))
+    try:
+        for result in results:
+            if use_cache and not result['skipped']:
+                manifest = manifests[os.path.dirname(os.path.abspath(result['file_path']))]
+                name = os.path.basename(result['file_path'])
+                if result['error'] is not None:
+                    manifest.pop(name, None)
+                else:
+                    manifest[name] = {
+                        'sha256': result['sha256'], 'converter': fingerprint, 'stats': stats, 'rows': result['rows'],
+                    }
+            yield result
+    finally:
+        if jobs != 1 and len(tasks) > 1:
+            executor.shutdown()
+        for directory, manifest in manifests.items():
+            save_manifest(directory, manifest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert raw FISHER CSV logs into one row per trial.")
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help="Raw CSV files (optionally .gz/.zst), directories (searched recursively) or glob patterns. "
+             "'-' converts stdin to stdout.",
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes. Default is the number of CPUs.",
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help="Reconvert every input, even if it is unchanged since it was last converted.",
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help="Add median, std, min, max and time-weighted average columns per emotion, and the face detected ratio.",
+    )
+    args = parser.parse_args(argv)
+
+    if '-' in args.inputs:
+        if len(args.inputs) > 1:
+            parser.error("'-' can't be combined with other inputs")
+        if not write_simplified(simplify(sys.stdin, args.stats), sys.stdout):
+            print("No trials found in stdin", file=sys.stderr)
+            return 1
+        return 0
+
+    file_paths = expand_inputs(args.inputs)
+    if not file_paths:
+        print("No input files found.", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    converted = 0
+    skipped = 0
+    total_rows = 0
+    failures = []
+    for result in convert_many(file_paths, args.jobs, use_cache=True, force=args.force, stats=args.stats):
+        file_path = result['file_path']
+        if result['error'] is not None:
+            failures.append(file_path)
+            print(f"FAILED {file_path}: {result['error']}", file=sys.stderr)
+        elif result['skipped']:
+            skipped += 1
+            print(f"Unchanged {file_path} -> {result['output_path']}")
+        else:
+            converted += 1
+            total_rows += result['rows']
+            print(f"Converted {file_path} -> {result['output_path']}")
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    print(
+        f"Converted {converted}/{len(file_paths)} files ({total_rows} rows, {skipped} unchanged and skipped) "
+        f"in {elapsed:.2f}s: {converted / elapsed:.1f} files/s, {total_rows / elapsed:.0f} rows/s"
+    )
+    if failures:
+        print(f"{len(failures)} file(s) failed: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
 if __name__ == "__main__":
-    # Convert each file passed as argument
-    for file_path in sys.argv[1:]:
-        convert_csv(file_path)
+    sys.exit(main())
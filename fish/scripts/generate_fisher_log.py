@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+# This script writes synthetic raw FISHER logs, with the same layout and event vocabulary as the ones the game
+# downloads ('Trial started', 'Face detected', 'No face detected', 'Starfish appeared', 'Average happy',
+# 'Fish clicked correctly/incorrectly', ...), to test and benchmark convert_csv.py on logs of any size.
+# Usage:
+#     python3 generate_fisher_log.py <output_csv> --trials 200
+#     python3 generate_fisher_log.py <output_csv> --size 100M --face-rate 0.5 --emotions 12
+# With --size the log gets as many trials as needed to reach that size. --emotions above 7 adds made-up
+# emotion names after the real ones. The same --seed always gives the same log.
+
+import argparse
+import datetime
+import random
+import sys
+
+from convert_csv import EMOTIONS
+
+HEADER = 'Timestamp,Event,Metadata\n'
+STARFISH_IMAGES = [f'image{i}.png' for i in range(1, 9)]
+SIZE_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(size):
+    """Bytes from a size like 1048576, 512K, 100M or 1G."""
+    size = size.strip().upper()
+    if size[-1:] in SIZE_UNITS:
+        return int(float(size[:-1]) * SIZE_UNITS[size[-1]])
+    return int(size)
+
+
+def emotion_names(count):
+    return EMOTIONS[:count] + [f'emotion{i}' for i in range(len(EMOTIONS), count)]
+
+
+def generate_log(
+    output,
+    trials=None,
+    size=None,
+    face_rate=0.9,
+    emotions=len(EMOTIONS),
+    trial_duration=5000,
+    detect_faces_interval=100,
+    seed=0,
+):
+    """Write a synthetic raw log to the text file `output`, returning the number of trials written.
+
+    Stops after `trials` trials, or once at least `size` bytes are written, whichever comes first.
+    """
+    if trials is None and size is None:
+        raise ValueError("Either trials or size is needed")
+    rng = random.Random(seed)
+    names = emotion_names(emotions)
+    clock = datetime.datetime(2024, 9, 23, 21, 55, 16, tzinfo=datetime.timezone.utc)
+    written = 0
+
+    def write(milliseconds, event, *metadata):
+        nonlocal clock, written
+        clock += datetime.timedelta(milliseconds=milliseconds)
+        line = f"{clock.isoformat(timespec='milliseconds').replace('+00:00', 'Z')},{event},{','.join(metadata)}\n"
+        output.write(line)
+        written += len(line)
+
+    output.write(HEADER)
+    written += len(HEADER)
+    settings = ['trial_duration', str(trial_duration), 'detect_faces_interval', str(detect_faces_interval)]
+    if trials is not None:
+        settings = ['number_of_trials', str(trials)] + settings
+    write(0, 'Page loaded', 'subject_id', 'synthetic', 'session_number', '1', *settings)
+    write(0, 'Loading models')
+    write(89, 'Setting up webcam')
+    write(224, 'Webcam ready')
+    write(855, 'Game started')
+
+    trial_number = 0
+    while (trials is None or trial_number < trials) and (size is None or written < size):
+        trial_number += 1
+        write(1, 'Trial started', str(trial_number))
+        starfish_at = rng.randrange(trial_duration // 5, trial_duration * 4 // 5)
+        # Most of the time the fish gets clicked a bit after the starfish appears
+        click_at = starfish_at + rng.randrange(100, 1500) if rng.random() < 0.7 else None
+        elapsed = 0
+        starfish_shown = False
+        happy_sum = 0.0
+        happy_count = 0
+        while elapsed < trial_duration:
+            step = detect_faces_interval + rng.randrange(-20, 30)
+            elapsed += step
+            if not starfish_shown and elapsed >= starfish_at:
+                starfish_shown = True
+                write(step, 'Starfish appeared', rng.choice(STARFISH_IMAGES))
+                continue
+            if click_at is not None and elapsed >= click_at:
+                # Clicking the fish reports the happy average since the starfish appeared
+                click_at = None
+                write(step, 'Average happy', repr(happy_sum / happy_count) if happy_count else 'null')
+                write(0, 'Fish clicked correctly')
+                continue
+            if rng.random() < 0.05:
+                write(step, 'Fish clicked incorrectly')
+            elif rng.random() < face_rate:
+                weights = [rng.random() ** 3 for _ in names]
+                total = sum(weights)
+                values = [weight / total for weight in weights]
+                if starfish_shown:
+                    happy_sum += values[1] if len(values) > 1 else 0.0
+                    happy_count += 1
+                write(step, 'Face detected', *(f'{name},{value!r}' for name, value in zip(names, values)))
+            else:
+                write(step, 'No face detected')
+    write(1, 'Game ended')
+    return trial_number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic raw FISHER log.")
+    parser.add_argument('output', help="Path of the raw CSV log to write.")
+    parser.add_argument('--trials', type=int, help="Number of trials.")
+    parser.add_argument('--size', type=parse_size, help="Approximate size to reach instead, e.g. 10M or 1G.")
+    parser.add_argument('--face-rate', type=float, default=0.9, help="Share of face detection attempts that find a face.")
+    parser.add_argument('--emotions', type=int, default=len(EMOTIONS), help="Number of emotions per face detection.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.trials is None and args.size is None:
+        parser.error("one of --trials or --size is required")
+
+    with open(args.output, 'w') as output:
+        trials = generate_log(
+            output, trials=args.trials, size=args.size, face_rate=args.face_rate, emotions=args.emotions, seed=args.seed,
+        )
+    print(f"Wrote {trials} trials to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
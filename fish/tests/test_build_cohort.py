@@ -0,0 +1,96 @@
+from pathlib import Path
+import csv
+import math
+import shutil
+import pytest
+from build_cohort import append_sessions, load_schema, main, read_columns
+
+TESTS_DIR = Path(__file__).parent
+FIXTURES_DIR = TESTS_DIR / "fixtures"
+
+
+def expected_rows(fixture_number):
+    with open(FIXTURES_DIR / f"expected_output_{fixture_number}.csv") as file:
+        return list(csv.DictReader(file))
+
+
+def test_cohort_matches_simplified_outputs(tmp_path):
+    # A raw log and a simplified file go in side by side, and read back like the converter's output
+    shutil.copy(FIXTURES_DIR / "input_1.csv", tmp_path / "FISHER_results_p01_1.csv")
+    shutil.copy(FIXTURES_DIR / "expected_output_2.csv", tmp_path / "FISHER_results_p02_3_simplified.csv")
+    cohort_dir = tmp_path / "cohort"
+    assert main([str(cohort_dir), str(tmp_path / "FISHER_results_p01_1.csv"),
+                 str(tmp_path / "FISHER_results_p02_3_simplified.csv")]) == 0
+
+    columns = read_columns(cohort_dir)
+    rows = expected_rows(1) + expected_rows(2)
+    assert columns['subject_id'] == ['p01'] * len(expected_rows(1)) + ['p02'] * len(expected_rows(2))
+    assert columns['session_number'] == ['1'] * len(expected_rows(1)) + ['3'] * len(expected_rows(2))
+    for index, row in enumerate(rows):
+        assert columns['trial_number'][index] == int(row['trial_number'])
+        assert columns['Face detected'][index] == int(row['Face detected'])
+        assert columns['starfish_image'][index] == (None if row['starfish_image'] == 'None' else row['starfish_image'])
+        for name in ('happy', 'Average Happy'):
+            if row[name] == 'nan':
+                assert math.isnan(columns[name][index])
+            else:
+                assert columns[name][index] == float(row[name])
+
+
+def test_cohort_appends_new_sessions_only(tmp_path):
+    shutil.copy(FIXTURES_DIR / "input_1.csv", tmp_path / "FISHER_results_p01_1.csv")
+    cohort_dir = tmp_path / "cohort"
+    append_sessions(cohort_dir, [str(tmp_path / "FISHER_results_p01_1.csv")])
+
+    shutil.copy(FIXTURES_DIR / "input_3.csv", tmp_path / "FISHER_results_p01_2.csv")
+    added, skipped = append_sessions(
+        cohort_dir, [str(tmp_path / "FISHER_results_p01_1.csv"), str(tmp_path / "FISHER_results_p01_2.csv")]
+    )
+    assert added == [str(tmp_path / "FISHER_results_p01_2.csv")]
+    assert skipped == [str(tmp_path / "FISHER_results_p01_1.csv")]
+
+    schema = load_schema(cohort_dir)
+    assert schema['row_count'] == len(expected_rows(1)) + len(expected_rows(3))
+    assert schema['dictionaries']['subject_id'] == ['p01']
+
+    # Only the requested columns are read, with codes left undecoded on request
+    columns = read_columns(cohort_dir, ['session_number', 'happy'], decode=False)
+    assert set(columns) == {'session_number', 'happy'}
+    assert list(columns['session_number']) == [0] * len(expected_rows(1)) + [1] * len(expected_rows(3))
+
+
+def test_cohort_from_directory_prefers_raw_logs(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    (sessions_dir / "p02").mkdir(parents=True)
+    shutil.copy(FIXTURES_DIR / "input_1.csv", sessions_dir / "FISHER_results_p01_1.csv")
+    # Session p01/1 also has a simplified file, which mustn't be ingested a second time
+    shutil.copy(FIXTURES_DIR / "expected_output_3.csv", sessions_dir / "FISHER_results_p01_1_simplified.csv")
+    shutil.copy(FIXTURES_DIR / "expected_output_2.csv", sessions_dir / "p02" / "FISHER_results_p02_3_simplified.csv")
+    cohort_dir = tmp_path / "cohort"
+    assert main([str(cohort_dir), str(sessions_dir)]) == 0
+
+    schema = load_schema(cohort_dir)
+    assert schema['sessions'] == {
+        'p01/1': {'source': 'FISHER_results_p01_1.csv', 'rows': len(expected_rows(1))},
+        'p02/3': {'source': 'FISHER_results_p02_3_simplified.csv', 'rows': len(expected_rows(2))},
+    }
+
+    # A glob of simplified files alone gets them in too
+    glob_cohort_dir = tmp_path / "glob_cohort"
+    assert main([str(glob_cohort_dir), str(sessions_dir / "**" / "*_simplified.csv")]) == 0
+    assert set(load_schema(glob_cohort_dir)['sessions']) == {'p01/1', 'p02/3'}
+
+
+def test_cohort_skips_stray_csv_files_unless_named(tmp_path, capsys):
+    sessions_dir = tmp_path / "sessions"
+    sessions_dir.mkdir()
+    shutil.copy(FIXTURES_DIR / "input_1.csv", sessions_dir / "FISHER_results_p01_1.csv")
+    (sessions_dir / "benchmark_results.csv").write_text("files,seconds\n1,0.5\n")
+    cohort_dir = tmp_path / "cohort"
+    assert main([str(cohort_dir), str(sessions_dir)]) == 0
+    assert set(load_schema(cohort_dir)['sessions']) == {'p01/1'}
+    assert "Skipping" in capsys.readouterr().err
+
+    # Naming the file explicitly is still an error
+    with pytest.raises(ValueError, match="benchmark_results.csv"):
+        main([str(tmp_path / "named_cohort"), str(sessions_dir / "benchmark_results.csv")])
@@ -1,8 +1,16 @@
 from pathlib import Path
 import os
 import glob
+import random
+import shutil
+import statistics
+import csv
+import gzip
+import io
 import pytest
-from convert_csv import convert_csv
+import convert_csv as convert_csv_module
+from convert_csv import convert_csv, iter_trials, main, RunningMean
+from generate_fisher_log import generate_log
 
 TESTS_DIR = Path(__file__).parent
 
@@ -30,3 +38,130 @@ def test_convert_csv(input_file, request):
         with open(output_file, 'r') as output, open(expected_output_file, 'r') as expected:
             assert output.read() == expected.read(), f"Mismatch for {input_file}"
             os.remove(output_file)
+
+
+def test_running_mean_matches_statistics_mean():
+    # The streaming converter must round exactly like the statistics.mean it replaced
+    rng = random.Random(0)
+    for _ in range(500):
+        values = [rng.random() ** rng.randint(1, 8) for _ in range(rng.randint(1, 50))]
+        running_mean = RunningMean()
+        for value in values:
+            running_mean.add(value)
+        assert running_mean.mean() == statistics.mean(values)
+
+
+def test_batch_conversion_reports_failures_without_aborting(tmp_path, capsys):
+    for input_file in (TESTS_DIR / "fixtures").glob("input_*.csv"):
+        shutil.copy(input_file, tmp_path / input_file.name)
+    (tmp_path / "broken.csv").write_text("Timestamp,Event,Metadata\n")
+
+    assert main([str(tmp_path), "--jobs", "2"]) == 1
+
+    for expected_output_file in (TESTS_DIR / "fixtures").glob("expected_output_*.csv"):
+        output_file = tmp_path / expected_output_file.name.replace("expected_output_", "input_").replace(".csv", "_simplified.csv")
+        assert output_file.read_text() == expected_output_file.read_text()
+    assert not (tmp_path / "broken_simplified.csv").exists()
+    captured = capsys.readouterr()
+    assert "FAILED" in captured.err and "broken.csv" in captured.err
+    assert "Converted 4/5 files" in captured.out
+
+
+def test_batch_conversion_skips_unchanged_inputs(tmp_path, capsys, monkeypatch):
+    shutil.copy(TESTS_DIR / "fixtures" / "input_1.csv", tmp_path / "input_1.csv")
+    shutil.copy(TESTS_DIR / "fixtures" / "input_3.csv", tmp_path / "input_3.csv")
+
+    assert main([str(tmp_path), "--jobs", "1"]) == 0
+    assert "Converted 2/2 files" in capsys.readouterr().out
+
+    # Unchanged inputs are skipped, a modified one is converted again
+    with open(tmp_path / "input_3.csv", "a") as file:
+        file.write("2024-09-23T21:56:00.000Z,No face detected,null\n")
+    assert main([str(tmp_path), "--jobs", "1"]) == 0
+    out = capsys.readouterr().out
+    assert "Converted 1/2 files" in out and "1 unchanged and skipped" in out
+    assert f"Unchanged {tmp_path / 'input_1.csv'}" in out
+
+    # A change to the conversion logic invalidates everything
+    monkeypatch.setattr(convert_csv_module, "CONVERTER_VERSION", convert_csv_module.CONVERTER_VERSION + 1)
+    convert_csv_module.converter_fingerprint.cache_clear()
+    try:
+        assert main([str(tmp_path), "--jobs", "1"]) == 0
+        assert "Converted 2/2 files" in capsys.readouterr().out
+    finally:
+        convert_csv_module.converter_fingerprint.cache_clear()
+
+
+def test_stats_columns_are_opt_in(tmp_path):
+    input_file = tmp_path / "input_1.csv"
+    shutil.copy(TESTS_DIR / "fixtures" / "input_1.csv", input_file)
+    expected = (TESTS_DIR / "fixtures" / "expected_output_1.csv").read_text().splitlines()
+
+    output_file = convert_csv(str(input_file), stats=True)
+    with open(output_file) as file:
+        header, *rows = [line.split(',') for line in file.read().splitlines()]
+
+    # The default columns come first, unchanged
+    default_width = len(expected[0].split(','))
+    assert [','.join(row[:default_width]) for row in [header, *rows]] == expected
+    for row in rows:
+        trial = dict(zip(header, row))
+        for emotion in convert_csv_module.EMOTIONS:
+            assert float(trial[f'{emotion} min']) <= float(trial[f'{emotion} median']) <= float(trial[f'{emotion} max'])
+            assert float(trial[f'{emotion} min']) <= float(trial[f'{emotion} time-weighted']) <= float(trial[f'{emotion} max'])
+        faces, no_faces = int(trial['Face detected']), int(trial['No face detected'])
+        assert float(trial['Face detected ratio']) == round(faces / (faces + no_faces), 2)
+
+
+def test_stats_match_without_numpy(monkeypatch):
+    # The bulk (numpy) statistics and the pure Python fallback agree, including for samples missing emotions
+    output = io.StringIO()
+    generate_log(output, trials=30, face_rate=0.6, emotions=9, seed=3)
+    lines = output.getvalue().splitlines(keepends=True)
+    trial_start = next(i for i, line in enumerate(lines) if ',Trial started,2' in line)
+    timestamp = lines[trial_start].split(',')[0]
+    lines.insert(trial_start + 1, f"{timestamp},Face detected,happy,0.5\n")
+    with_numpy = list(convert_csv_module.simplify(lines, stats=True))
+    monkeypatch.setattr(convert_csv_module, 'np', None)
+    assert list(convert_csv_module.simplify(lines, stats=True)) == with_numpy
+    assert convert_csv_module.parse_timestamp('2024-09-23T21:55:17.544Z') == 1727128517.544
+
+
+def test_synthetic_logs_convert():
+    output = io.StringIO()
+    assert generate_log(output, trials=5, face_rate=0.5, emotions=9, seed=1) == 5
+    trials = list(iter_trials(csv.reader(io.StringIO(output.getvalue()))))
+    assert [trial['trial_number'] for trial in trials] == [1, 2, 3, 4, 5]
+    assert all(trial['Face detected'] and trial['No face detected'] for trial in trials)
+    assert 'emotion8' in trials[0]
+
+    # The same seed gives the same log, and a size target is reached
+    again = io.StringIO()
+    generate_log(again, trials=5, face_rate=0.5, emotions=9, seed=1)
+    assert again.getvalue() == output.getvalue()
+    sized = io.StringIO()
+    generate_log(sized, size=100_000)
+    assert len(sized.getvalue()) >= 100_000
+
+
+def test_compressed_and_streamed_inputs(tmp_path, capsys, monkeypatch):
+    raw = (TESTS_DIR / "fixtures" / "input_1.csv").read_text()
+    expected = (TESTS_DIR / "fixtures" / "expected_output_1.csv").read_text()
+
+    # The library API takes text or binary lines, or already-split rows
+    from_lines = list(convert_csv_module.simplify(io.StringIO(raw)))
+    from_rows = list(convert_csv_module.simplify(csv.reader(io.StringIO(raw))))
+    assert from_lines == from_rows and len(from_lines) == 2
+    assert list(convert_csv_module.simplify(io.BytesIO(raw.encode()))) == from_lines
+
+    with gzip.open(tmp_path / "input_1.csv.gz", "wt") as file:
+        file.write(raw)
+    with gzip.open(tmp_path / "input_1.csv.gz") as file:
+        assert list(convert_csv_module.simplify(file)) == from_lines
+    assert main([str(tmp_path), "--jobs", "1"]) == 0
+    assert (tmp_path / "input_1_simplified.csv").read_text() == expected
+
+    capsys.readouterr()
+    monkeypatch.setattr("sys.stdin", io.StringIO(raw))
+    assert main(["-"]) == 0
+    assert capsys.readouterr().out == expected